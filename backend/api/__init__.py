@@ -1,3 +1,4 @@
 """
-API package - Contains FastAPI route definitions and SSE utilities.
+API package - Contains FastAPI route definitions, SSE utilities and the
+navigator worker process.
 """
@@ -6,26 +6,126 @@ Endpoints:
     POST /api/execute - Execute ActionPlan, streams SSE logs
 """
 import asyncio
-import uuid
+import os
+import tempfile
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict
+from typing import BinaryIO, Iterator, Optional
 
 from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 import aiofiles
 
+try:
+    import pybase64 as base64  # SIMD base64, same API as the stdlib module
+except ImportError:  # stdlib base64 is the fallback
+    import base64
+
 from cortex.schemas import ExecutionPlan, ActionStep
-from cortex.vision_parser import parse_video, parse_video_from_url
-from cortex.navigator import Navigator, NavigatorCallback
+from cortex.vision_parser import parse_video, parse_video_from_url, video_hasher
+from cortex.navigator import NavigatorCallback
 from api.sse import ExecutionStream
+from api.worker import run_in_worker
 from config import get_settings
 
 
 router = APIRouter(prefix="/api", tags=["execution"])
 settings = get_settings()
 
-# Store active execution streams
-active_streams: Dict[str, ExecutionStream] = {}
+# Active execution streams. Entries are weak: the background task and the
+# SSE response hold the strong references, so a finished stream (and the
+# screenshots buffered in it) is released as soon as both are done with it.
+active_streams: "weakref.WeakValueDictionary[str, ExecutionStream]" = weakref.WeakValueDictionary()
+
+# Caps how many plans drive a browser at once; extra executions wait their turn
+_exec_sem = asyncio.Semaphore(settings.max_concurrent_executions)
+
+# Upload chunk size when persisting videos to disk
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Leading bytes of an upload inspected to confirm it really is a video
+VIDEO_SNIFF_SIZE = 16
+
+# EBML header that starts every WebM (Matroska) file
+_WEBM_MAGIC = b"\x1a\x45\xdf\xa3"
+
+# ISO base media (MP4/MOV) box types that can open a file, found at offset 4
+_ISO_BMFF_BOXES = (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip")
+
+# Seconds between SSE keep-alive pings (keeps proxies from dropping idle streams)
+SSE_PING_INTERVAL = 15
+
+
+# Compression middleware would buffer frames while filling its window;
+# responses that already declare an encoding are passed through untouched.
+_SSE_NO_COMPRESSION = {"Content-Encoding": "identity"}
+
+
+@lru_cache
+def _event_source_response() -> Optional[type]:
+    """Return sse-starlette's EventSourceResponse if it is installed."""
+    try:
+        from sse_starlette.sse import EventSourceResponse
+    except ImportError:
+        return None
+    return EventSourceResponse
+
+
+def _looks_like_video(head: bytes) -> bool:
+    """Check the leading bytes of an upload against MP4/MOV/WebM signatures."""
+    return head.startswith(_WEBM_MAGIC) or head[4:8] in _ISO_BMFF_BOXES
+
+
+def _spooled_fileno(video: UploadFile) -> Optional[int]:
+    """
+    Return the OS file descriptor backing an upload, if it was spooled to disk.
+    
+    Starlette keeps uploads up to 1 MiB in memory and rolls larger ones over
+    to a temporary file; only the latter can be copied with sendfile.
+    """
+    if not hasattr(os, "sendfile") or video.size is None or video.size <= UPLOAD_CHUNK_SIZE:
+        return None
+    try:
+        return video.file.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _sendfile_copy(src_fd: int, dest_fd: int, size: int) -> None:
+    """Copy size bytes from src_fd into dest_fd without going through userspace."""
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dest_fd, src_fd, offset, size - offset)
+        if not sent:
+            break
+        offset += sent
+
+
+@contextmanager
+def _video_tempfile(directory: Path) -> Iterator[tuple[BinaryIO, Path]]:
+    """
+    Yield a writable temp file and a path it can be read back from.
+    
+    On Linux this is an O_TMPFILE inode with no directory entry: it is
+    reachable only through /proc/self/fd and is released when closed, even
+    if the process dies. Elsewhere it falls back to NamedTemporaryFile.
+    """
+    tmpfile_flag = getattr(os, "O_TMPFILE", None)
+    fd = None
+    if tmpfile_flag is not None:
+        try:
+            fd = os.open(directory, tmpfile_flag | os.O_RDWR, 0o600)
+        except OSError:
+            # Filesystem without O_TMPFILE support
+            fd = None
+    if fd is not None:
+        with open(fd, "w+b") as f:
+            yield f, Path(f"/proc/self/fd/{fd}")
+    else:
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".mp4") as f:
+            yield f, Path(f.name)
 
 
 class SSENavigatorCallback(NavigatorCallback):
@@ -35,20 +135,21 @@ class SSENavigatorCallback(NavigatorCallback):
         self.stream = stream
     
     async def on_step_start(self, step: ActionStep) -> None:
-        await self.stream.send_action(step.id, "running")
-        await self.stream.send_log(
+        self.stream.send_action_with_log(
+            step.id,
+            "running",
             f"Step {step.id}: {step.action_type} - {step.description}"
         )
     
-    async def on_step_complete(self, step: ActionStep, screenshot_b64: str) -> None:
-        await self.stream.send_action(step.id, "complete", screenshot_b64)
+    async def on_step_complete(self, step: ActionStep, screenshot: bytes) -> None:
+        # Base64 only where it's needed: the JSON frame sent to the browser
+        self.stream.send_action(step.id, "complete", base64.b64encode(screenshot).decode("ascii"))
     
     async def on_step_error(self, step: ActionStep, error: str) -> None:
-        await self.stream.send_action(step.id, "error")
-        await self.stream.send_log(f"Error: {error}", "error")
+        self.stream.send_action_with_log(step.id, "error", f"Error: {error}", "error")
     
     async def on_log(self, message: str, level: str = "info") -> None:
-        await self.stream.send_log(message, level)
+        self.stream.send_log(message, level)
 
 
 @router.post("/analyze")
@@ -67,24 +168,48 @@ async def analyze_video(video: UploadFile = File(...)) -> ExecutionPlan:
             detail=f"Invalid file type. Allowed: {allowed_types}"
         )
     
-    # Save video to temp directory
-    temp_dir = Path(settings.temp_dir)
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    
-    video_id = str(uuid.uuid4())
-    video_path = temp_dir / f"{video_id}.mp4"
+    # content_type is client-supplied; sniff the header before touching disk
+    head = await video.read(VIDEO_SNIFF_SIZE)
+    await video.seek(0)
+    if not _looks_like_video(head):
+        raise HTTPException(
+            status_code=415,
+            detail="File content is not a recognized MP4, WebM or MOV video"
+        )
     
-    async with aiofiles.open(video_path, "wb") as f:
-        content = await video.read()
-        await f.write(content)
+    max_bytes = settings.max_video_size_mb * 1024 * 1024
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Video exceeds {settings.max_video_size_mb} MB limit"
+    )
+    if video.size is not None and video.size > max_bytes:
+        raise too_large
     
-    try:
-        # Analyze video with Gemini
-        plan = await parse_video(video_path)
+    # The temp file disappears when this block exits, no cleanup needed
+    with _video_tempfile(settings.temp_path) as (tmp, video_path):
+        digest = None
+        src_fd = _spooled_fileno(video)
+        if src_fd is not None:
+            # Already on disk: let the kernel copy file to file
+            await asyncio.to_thread(_sendfile_copy, src_fd, tmp.fileno(), video.size)
+        else:
+            # Stream to disk in chunks so memory stays flat regardless of upload size.
+            # The chunks are hashed on the way through, so the upload cache
+            # doesn't have to read the file back.
+            written = 0
+            hasher = video_hasher()
+            async with aiofiles.open(tmp.fileno(), "wb", closefd=False) as f:
+                while chunk := await video.read(UPLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise too_large
+                    hasher.update(chunk)
+                    await f.write(chunk)
+            digest = hasher.hexdigest()
+        
+        # Analyze video with Gemini (the path has no extension to guess from)
+        plan = await parse_video(video_path, mime_type=video.content_type, digest=digest)
         return plan
-    finally:
-        # Clean up temp file
-        video_path.unlink(missing_ok=True)
 
 
 class UrlAnalyzeRequest:
@@ -107,13 +232,13 @@ async def analyze_video_url(request: dict) -> ExecutionPlan:
             detail="Missing 'url' field in request body"
         )
     
-    # Create temp directory for downloaded video
-    temp_dir = Path(settings.temp_dir)
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    
     try:
         # Download and analyze video from URL
-        plan = await parse_video_from_url(url, temp_dir)
+        plan = await parse_video_from_url(
+            url,
+            settings.temp_path,
+            download_concurrency=settings.download_concurrency
+        )
         return plan
     except Exception as e:
         raise HTTPException(
@@ -164,38 +289,49 @@ async def run_execution(
     plan: ExecutionPlan,
     stream: ExecutionStream
 ) -> None:
-    """Background task that runs the execution."""
+    """Background task that runs the execution in a navigator worker process."""
     callback = SSENavigatorCallback(stream)
-    nav = Navigator(callback=callback, headless=False)
+    
+    if _exec_sem.locked():
+        stream.send_log("Queued: waiting for a free browser slot...", "info")
     
     try:
-        await nav.start()
-        await nav.execute_plan(plan)
-        await stream.send_log("Execution complete!", "success")
-    except Exception as e:
-        await stream.send_log(f"Execution failed: {e}", "error")
+        async with _exec_sem:
+            try:
+                await run_in_worker(plan, callback, headless=False)
+                stream.send_log("Execution complete!", "success")
+            except Exception as e:
+                stream.send_log(f"Execution failed: {e}", "error")
     finally:
-        await nav.stop()
-        await stream.close()
-        # Clean up stream after a delay
-        await asyncio.sleep(5)
-        active_streams.pop(execution_id, None)
+        # Give the SSE client a chance to receive the final events
+        await stream.drain_and_close()
 
 
 @router.get("/execute/{execution_id}/stream")
-async def stream_execution(execution_id: str) -> StreamingResponse:
+async def stream_execution(execution_id: str) -> Response:
     """
     SSE stream for execution updates.
     
     Connect to this endpoint to receive real-time logs and screenshots.
+    Uses sse-starlette when available for keep-alive pings during long
+    steps; the stream already yields framed bytes, which it passes through.
     """
-    if execution_id not in active_streams:
+    stream = active_streams.get(execution_id)
+    if stream is None:
         raise HTTPException(
             status_code=404,
             detail=f"Execution {execution_id} not found"
         )
     
-    stream = active_streams[execution_id]
+    # The response's iterator holds the stream for as long as the client is connected
+    event_source_response = _event_source_response()
+    if event_source_response is not None:
+        # Sets no-cache, keep-alive and X-Accel-Buffering headers itself
+        return event_source_response(
+            stream,
+            ping=SSE_PING_INTERVAL,
+            headers=_SSE_NO_COMPRESSION
+        )
     
     return StreamingResponse(
         stream,
@@ -203,7 +339,8 @@ async def stream_execution(execution_id: str) -> StreamingResponse:
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+            **_SSE_NO_COMPRESSION
         }
     )
 
@@ -3,64 +3,190 @@ SSE Utilities - Server-Sent Events streaming helpers.
 
 Provides utilities for streaming real-time execution logs to the frontend.
 """
+from collections import deque
 from typing import AsyncGenerator
 import asyncio
 import json
 
+try:
+    import orjson
+except ImportError:  # stdlib json is the fallback
+    orjson = None
 
-async def event_generator(
-    event_type: str,
-    data: dict
-) -> str:
-    """Format data as SSE event string."""
-    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def _dumps(data: dict) -> bytes:
+    """Serialize data to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    # ensure_ascii=False skips the \uXXXX escaping pass
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# Every frame has the same shape, only the JSON payload varies
+_SSE_PREFIX = b"event: message\ndata: "
+_SSE_SUFFIX = b"\n\n"
+_DROPPED_PREFIX = b"event: dropped\ndata: "
+
+# Upper bound on frames waiting for a slow client
+MAX_BUFFERED_EVENTS = 256
+
+
+def build_frame(payload: bytes) -> bytes:
+    """Wrap a serialized JSON payload in an SSE message frame."""
+    return b"".join((_SSE_PREFIX, payload, _SSE_SUFFIX))
 
 
 class ExecutionStream:
     """
     Manages SSE streaming for a single execution session.
-    
+
+    There is exactly one producer (the Navigator callback) and one consumer
+    (the SSE response), so events go through a plain deque and a single
+    Event is used to wake the consumer. Events are serialized by the
+    producer, the consumer only forwards ready-made frames.
+
+    The buffer is bounded so a slow client cannot grow it without limit and
+    the producer never has to wait. On overflow, consecutive log lines are
+    folded into a single "... (N more lines)" marker; anything else evicts
+    the oldest frame. The number of lost events is kept in `dropped`.
+
     Usage:
         stream = ExecutionStream()
-        await stream.send_log("Starting execution...")
-        await stream.send_action(step_id=1, status="running")
+        stream.send_log("Starting execution...")
+        stream.send_action(step_id=1, status="running")
+        stream.send_action_with_log(step_id=1, status="error", message="Timed out", level="error")
     """
-    
+
     def __init__(self):
-        self.queue: asyncio.Queue = asyncio.Queue()
+        self._buf: deque[tuple[str, bytes]] = deque()  # (event type, frame)
+        self._ev: asyncio.Event = asyncio.Event()
+        self._drained: asyncio.Event = asyncio.Event()
+        self._merged_logs: int = 0
+        self._reported_dropped: int = 0
+        self.dropped: int = 0
         self.is_active: bool = True
-    
-    async def send_log(self, message: str, level: str = "info") -> None:
+
+    def send_log(self, message: str, level: str = "info") -> None:
         """Send a log message to the stream."""
-        await self.queue.put({
+        self._push("log", {
             "type": "log",
             "level": level,
             "message": message
         })
-    
-    async def send_action(
+
+    def send_action(
         self,
         step_id: int,
         status: str,
         screenshot_b64: str | None = None
     ) -> None:
-        """Send an action status update."""
-        await self.queue.put({
+        """
+        Send an action status update.
+        
+        The frame is serialized immediately, so the stream never keeps a
+        reference to the (potentially large) screenshot string itself.
+        """
+        self._push("action", {
             "type": "action",
             "step_id": step_id,
             "status": status,
             "screenshot": screenshot_b64
         })
-    
-    async def close(self) -> None:
-        """Close the stream."""
+
+    def send_action_with_log(
+        self,
+        step_id: int,
+        status: str,
+        message: str,
+        level: str = "info",
+        screenshot_b64: str | None = None
+    ) -> None:
+        """
+        Send an action status update carrying a log line in the same frame.
+        
+        Saves a frame (and a client-side parse) on step transitions, where a
+        status change always comes with a matching log message.
+        """
+        self._push("action", {
+            "type": "action",
+            "step_id": step_id,
+            "status": status,
+            "screenshot": screenshot_b64,
+            "message": message,
+            "level": level
+        })
+
+    def _push(self, event_type: str, data: dict) -> None:
+        """Queue an event, applying the overflow policy if the buffer is full."""
+        if len(self._buf) >= MAX_BUFFERED_EVENTS:
+            self.dropped += 1
+            if event_type == "log" and self._buf[-1][0] == "log":
+                self._merged_logs += 1
+                return
+            self._buf.popleft()
+        self._flush_merged_logs(reserve=1)
+        self._buf.append((event_type, build_frame(_dumps(data))))
+        self._ev.set()
+
+    def _evict_oldest(self, room: int) -> None:
+        """Drop the oldest frames until room more fit within MAX_BUFFERED_EVENTS."""
+        while self._buf and len(self._buf) + room > MAX_BUFFERED_EVENTS:
+            self._buf.popleft()
+            self.dropped += 1
+
+    def _flush_merged_logs(self, reserve: int = 0) -> None:
+        """
+        Queue the marker standing in for log lines folded on overflow.
+        
+        Leaves room for reserve more frames, so the marker never pushes
+        the buffer past its bound.
+        """
+        if self._merged_logs:
+            self._evict_oldest(1 + reserve)
+            self._buf.append(("log", build_frame(_dumps({
+                "type": "log",
+                "level": "warning",
+                "message": f"... ({self._merged_logs} more lines)"
+            }))))
+            self._merged_logs = 0
+
+    def close(self) -> None:
+        """Close the stream. Buffered events are still delivered."""
         self.is_active = False
-        await self.queue.put(None)
-    
-    async def __aiter__(self) -> AsyncGenerator[str, None]:
+        self._ev.set()
+
+    async def drain_and_close(self, timeout: float = 5.0) -> None:
+        """Close the stream and wait (up to timeout) for the consumer to flush it."""
+        self.close()
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def __aiter__(self) -> AsyncGenerator[bytes, None]:
         """Iterate over stream events."""
-        while self.is_active:
-            data = await self.queue.get()
-            if data is None:
-                break
-            yield await event_generator("message", data)
+        try:
+            while True:
+                if not self._buf:
+                    # Only stop once everything sent before close() is out
+                    if not self.is_active:
+                        break
+                    await self._ev.wait()
+                    self._ev.clear()
+                    continue
+                self._flush_merged_logs(reserve=1)
+                if self.dropped != self._reported_dropped:
+                    self._evict_oldest(1)
+                    self._reported_dropped = self.dropped
+                    self._buf.append(("dropped", b"".join((
+                        _DROPPED_PREFIX, _dumps({"dropped": self.dropped}), _SSE_SUFFIX
+                    ))))
+                # Everything queued since the last wake-up goes out as one chunk,
+                # so a burst of events costs a single transport write.
+                chunk = b"".join([frame for _, frame in self._buf])
+                self._buf.clear()
+                yield chunk
+                # Give the transport a scheduler turn to flush this chunk
+                await asyncio.sleep(0)
+        finally:
+            self._drained.set()
@@ -0,0 +1,125 @@
+"""
+Navigator Worker - Runs plan execution in a child process.
+
+Playwright and the Navigator do synchronous work on the event loop thread
+(screenshot encoding, CDP message parsing), which would stall SSE delivery
+for every other execution sharing the server's loop. Each execution runs
+in its own process instead; navigator callbacks are relayed back to the
+parent over a pipe and replayed there on the real callback.
+"""
+import asyncio
+import multiprocessing
+from multiprocessing.connection import Connection
+
+try:
+    import uvloop  # Installed with uvicorn[standard], except on Windows
+except ImportError:  # the default asyncio loop is the fallback
+    uvloop = None
+
+from cortex.schemas import ActionStep, ExecutionPlan
+from cortex.navigator import Navigator, NavigatorCallback
+
+
+# Never fork the server process (running event loop, threads, open sockets)
+_mp = multiprocessing.get_context("spawn")
+
+# Seconds to let a finished worker exit on its own before terminating it
+_JOIN_TIMEOUT = 10
+
+# The server runs on uvloop under uvicorn; give the worker's CDP- and
+# HTTPS-heavy loop the same, since spawned children start on the default
+_loop_factory = uvloop.new_event_loop if uvloop is not None else None
+
+
+def _slim(step: ActionStep) -> ActionStep:
+    """Drop the reference frame, which parent-side callbacks never read."""
+    return step.model_copy(update={"visual_context": None})
+
+
+class PipeNavigatorCallback(NavigatorCallback):
+    """Forwards navigator callbacks to the parent process over a pipe."""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    async def on_step_start(self, step: ActionStep) -> None:
+        self.conn.send(("on_step_start", (_slim(step),)))
+
+    async def on_step_complete(self, step: ActionStep, screenshot: bytes) -> None:
+        self.conn.send(("on_step_complete", (_slim(step), screenshot)))
+
+    async def on_step_error(self, step: ActionStep, error: str) -> None:
+        self.conn.send(("on_step_error", (_slim(step), error)))
+
+    async def on_log(self, message: str, level: str = "info") -> None:
+        self.conn.send(("on_log", (message, level)))
+
+
+def _run_navigator(plan_data: dict, headless: bool, conn: Connection) -> None:
+    """Child process entry point: execute the plan, relaying callbacks over conn."""
+    async def run() -> None:
+        nav = Navigator(callback=PipeNavigatorCallback(conn), headless=headless)
+        try:
+            await nav.start()
+            await nav.execute_plan(ExecutionPlan.model_validate(plan_data))
+        finally:
+            await nav.stop()
+
+    try:
+        with asyncio.Runner(loop_factory=_loop_factory) as runner:
+            runner.run(run())
+        conn.send(("done", ()))
+    except Exception as e:
+        conn.send(("failed", (str(e),)))
+    finally:
+        conn.close()
+
+
+async def run_in_worker(
+    plan: ExecutionPlan,
+    callback: NavigatorCallback,
+    headless: bool = False
+) -> None:
+    """
+    Execute a plan in a child process, replaying its events on callback.
+
+    Raises:
+        RuntimeError: If the execution failed in the worker, or the worker
+            died (crash, OOM kill) before reporting that it finished.
+    """
+    recv_conn, send_conn = _mp.Pipe(duplex=False)
+    proc = _mp.Process(
+        target=_run_navigator,
+        args=(plan.model_dump(), headless, send_conn),
+        daemon=True
+    )
+    proc.start()
+    # The child now owns the only write end, so EOF means it is done
+    send_conn.close()
+
+    finished = False
+    terminated = False
+    try:
+        while True:
+            try:
+                method, args = await asyncio.to_thread(recv_conn.recv)
+            except EOFError:
+                break
+            if method == "done":
+                finished = True
+                continue
+            if method == "failed":
+                raise RuntimeError(args[0])
+            await getattr(callback, method)(*args)
+    finally:
+        await asyncio.to_thread(proc.join, _JOIN_TIMEOUT)
+        if proc.is_alive():
+            proc.terminate()
+            terminated = True
+            await asyncio.to_thread(proc.join, _JOIN_TIMEOUT)
+        recv_conn.close()
+
+    # EOF alone only means the pipe closed; a crashed child closes it too
+    if not finished or terminated or proc.exitcode:
+        reason = "had to be terminated" if terminated else f"exited with code {proc.exitcode}"
+        raise RuntimeError(f"Navigator worker {reason} before finishing the plan")
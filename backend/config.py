@@ -1,6 +1,8 @@
 """
 Configuration - Application settings loaded from environment variables.
 """
+from dataclasses import dataclass
+from pathlib import Path
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -10,6 +12,8 @@ class Settings(BaseSettings):
     
     # Gemini API
     gemini_api_key: str
+    primary_vision_model: str = "gemini-2.0-flash"  # SoM badge picks
+    fallback_vision_model: str = "gemini-pro-latest"  # Re-picks after a wrong click
     
     # Server
     host: str = "0.0.0.0"
@@ -19,17 +23,71 @@ class Settings(BaseSettings):
     # File Storage
     temp_dir: str = "./temp"
     max_video_size_mb: int = 100
+    download_concurrency: int = 4  # yt-dlp fragments fetched in parallel
+    
+    # Video analysis batching (off: each video gets its own streamed Gemini call)
+    batch_video_analysis: bool = False
+    analysis_batch_size: int = 4  # Videos per Gemini call at most
+    analysis_batch_window_ms: int = 200  # How long a batch waits for company
     
     # Playwright
     headless: bool = False  # False = visible browser for noVNC
     browser_timeout_ms: int = 30000
+    # Executions share the persistent browser profile, which Chromium locks
+    # to a single instance; raise only for setups without a shared profile
+    max_concurrent_executions: int = 1
     
     class Config:
         env_file = (".env", "../.env")
         env_file_encoding = "utf-8"
 
 
+@dataclass(frozen=True, slots=True)
+class RuntimeSettings:
+    """
+    Frozen snapshot of Settings handed to the rest of the app.
+    
+    Mirrors every Settings field (get_settings() fails at startup if the two
+    drift apart), plus values derived from them once.
+    """
+    
+    # Gemini API
+    gemini_api_key: str
+    primary_vision_model: str
+    fallback_vision_model: str
+    
+    # Server
+    host: str
+    port: int
+    debug: bool
+    
+    # File Storage
+    temp_dir: str
+    max_video_size_mb: int
+    download_concurrency: int
+    
+    # Video analysis batching
+    batch_video_analysis: bool
+    analysis_batch_size: int
+    analysis_batch_window_ms: int
+    
+    # Playwright
+    headless: bool
+    browser_timeout_ms: int
+    max_concurrent_executions: int
+    
+    # Derived
+    temp_path: Path  # temp_dir, created by get_settings()
+
+
 @lru_cache
-def get_settings() -> Settings:
-    """Get cached settings instance."""
-    return Settings()
+def get_settings() -> RuntimeSettings:
+    """
+    Get cached settings, parsed once and frozen into a RuntimeSettings.
+    
+    Also creates the temp directory, so request handlers can assume it exists.
+    """
+    settings = Settings()
+    temp_path = Path(settings.temp_dir)
+    temp_path.mkdir(parents=True, exist_ok=True)
+    return RuntimeSettings(**settings.model_dump(), temp_path=temp_path)
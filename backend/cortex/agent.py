@@ -10,15 +10,24 @@ Unlike the rigid plan-based navigator, this agent:
 This is more robust because it adapts to what's actually on screen.
 """
 import asyncio
-import base64
+import re
+import weakref
 from pathlib import Path
 from typing import Optional, List
 
+import httpx
 from google import genai
 from google.genai import types
-from playwright.async_api import async_playwright, Page
+from playwright.async_api import async_playwright, Browser, CDPSession, Page
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from pydantic import ValidationError
 
-from cortex.schemas import ActionStep, ExecutionPlan
+try:
+    import pybase64 as base64  # SIMD base64, same API as the stdlib module
+except ImportError:  # stdlib base64 is the fallback
+    import base64
+
+from cortex.schemas import ActionStep, AgentDecision, BadgeBatchChoice, BadgeChoice, ExecutionPlan
 from config import get_settings
 
 
@@ -36,7 +45,7 @@ def load_som_script():
     except FileNotFoundError:
         # Fallback if file not found (mostly for tests/safety)
         return """
-        window.DooleySOM = {
+        window.DooleySOM = window.DooleySOM || {
             inject: () => { return []; },
             cleanup: () => {}
         }
@@ -44,6 +53,158 @@ def load_som_script():
 
 SOM_SCRIPT_LOADER = load_som_script()
 
+# Persistent Chromium profile (cookies, logins) shared by agent runs
+BROWSER_PROFILE_DIR = Path("./temp/browser_profile")
+
+# Keep Chromium from throttling or deprioritising the automated page while
+# we wait on Gemini, and cut per-frame overhead
+CHROMIUM_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=CalculateNativeWinOcclusion,TranslateUI',
+    '--disable-gpu-vsync',
+    '--disable-dev-shm-usage',
+    '--disable-hang-monitor',
+    '--disable-ipc-flooding-protection',
+]
+
+# Parallel goals run headless at a fixed size to bound raster cost
+PARALLEL_VIEWPORT = {"width": 1280, "height": 800}
+
+# Screenshots sent to Gemini are capped to this many pixels on the long side;
+# the browser renders them at that size, badge rects stay in page coordinates.
+SCREENSHOT_MAX_SIDE = 1280
+
+# Captured straight from the compositor over CDP, already JPEG and base64
+# (the clip, which sets the output size, is added per capture)
+CDP_SCREENSHOT_PARAMS = {
+    "format": "jpeg",
+    "quality": 70,
+    "captureBeyondViewport": False,
+    "fromSurface": True,
+}
+
+
+# All Gemini calls of an executor go through one pooled HTTP/2 client, so
+# the connection set up by the warm-up request is reused by every step
+GEMINI_ASYNC_CLIENT_ARGS = {
+    "http2": True,
+    "limits": httpx.Limits(max_keepalive_connections=4, keepalive_expiry=120),
+}
+
+# Picking a badge is a simple visual lookup: the fast model is enough, and
+# the answer is a single number, so decoding is capped at a few tokens.
+BADGE_LOOKUP_MODEL = "gemini-2.0-flash"
+BADGE_LOOKUP_CONFIG = types.GenerateContentConfig(
+    temperature=0,
+    max_output_tokens=16,
+    response_mime_type="application/json",
+    response_schema=BadgeChoice
+)
+
+# Several TYPE steps placed in one call; the answer grows with the steps,
+# so decoding isn't capped
+BADGE_BATCH_LOOKUP_CONFIG = types.GenerateContentConfig(
+    temperature=0,
+    response_mime_type="application/json",
+    response_schema=BadgeBatchChoice
+)
+
+DECISION_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=AgentDecision
+)
+
+
+# Badges from one capture, keyed by badge number
+Badges = dict[int, dict]
+
+# Badge text is cut to this length for prompts
+BADGE_LABEL_LENGTH = 50
+
+# Most relevant badges listed in the decision prompt
+PROMPT_BADGE_LIMIT = 15
+
+# Goal phrases that point at a screen region, and the region names (from
+# som_injector.js) they match
+REGION_HINTS = {
+    "top-right": "top-right",
+    "top right": "top-right",
+    "top-left": "top-left",
+    "top left": "top-left",
+    "header": "header",
+    "sidebar": "sidebar",
+    "footer": "footer",
+    "search result": "main-content",
+    "main": "main-content",
+}
+
+# Cheap page fingerprint (no layout, no pixels): while it is unchanged, the
+# previous screenshot and badges still describe the page
+DOM_FINGERPRINT_SCRIPT = """() => [
+    location.href,
+    document.getElementsByTagName('*').length,
+    document.documentElement.textContent.length,
+    document.documentElement.scrollHeight,
+    window.scrollX, window.scrollY,
+    window.innerWidth, window.innerHeight
+].join('|')"""
+
+# Upper bound (ms) on event-driven waits after an action; they return as
+# soon as the page reaches the load state
+SETTLE_TIMEOUT_MS = 1500
+NETWORK_IDLE_TIMEOUT_MS = 3000
+
+# Focus checks used before typing; clearing an empty field is skipped
+TEXT_FIELD_FOCUSED_SCRIPT = """() => {
+    const el = document.activeElement;
+    return !!el && (el.tagName === 'INPUT' || el.tagName === 'TEXTAREA' || el.isContentEditable);
+}"""
+FOCUSED_FIELD_VALUE_SCRIPT = """() => {
+    const el = document.activeElement;
+    if (!el) return '';
+    if ('value' in el) return el.value;
+    return el.isContentEditable ? el.textContent : '';
+}"""
+
+# Words in a step description that name the ARIA role of its click target
+ROLE_HINTS = {
+    "button": "button",
+    "link": "link",
+    "tab": "tab",
+    "checkbox": "checkbox",
+    "menu item": "menuitem",
+    "option": "option",
+}
+
+# Agent actions that change the page in ways the fingerprint can miss
+# (input values, checked state, focus)
+PAGE_MUTATING_ACTIONS = {"CLICK", "TYPE", "NAVIGATE", "SCROLL"}
+
+
+def screenshot_clip(metrics: dict) -> dict:
+    """
+    Page.captureScreenshot clip covering the visible viewport, scaled so the
+    image comes out at most SCREENSHOT_MAX_SIDE pixels on its long side.
+    
+    metrics is a Page.getLayoutMetrics result. The output size includes the
+    device pixel ratio, which is the ratio of the (device pixel) visualViewport
+    to the cssVisualViewport.
+    """
+    viewport = metrics["cssVisualViewport"]
+    width, height = viewport["clientWidth"], viewport["clientHeight"]
+    device_width = metrics.get("visualViewport", {}).get("clientWidth") or width
+    pixel_ratio = device_width / width if width else 1
+    long_side = max(width, height) * pixel_ratio
+    return {
+        "x": viewport["pageX"],
+        "y": viewport["pageY"],
+        "width": width,
+        "height": height,
+        "scale": min(1, SCREENSHOT_MAX_SIDE / long_side) if long_side else 1,
+    }
 
 
 class AgentCallback:
@@ -86,7 +247,7 @@ class AgenticExecutor:
         self.headless = headless
         self.max_actions_per_goal = max_actions_per_goal
         
-        self.user_data_dir = Path("./temp/browser_profile")
+        self.user_data_dir = BROWSER_PROFILE_DIR
         self.user_data_dir.mkdir(parents=True, exist_ok=True)
         
         self.screenshot_dir = Path("./temp/screenshots")
@@ -95,30 +256,82 @@ class AgenticExecutor:
         self.playwright = None
         self.context = None
         self.page: Optional[Page] = None
-        self.client = genai.Client(api_key=settings.gemini_api_key)
+        self.browser: Optional[Browser] = None  # Shared by parallel goals, launched on demand
+        self._cdp_sessions: "weakref.WeakKeyDictionary[Page, CDPSession]" = weakref.WeakKeyDictionary()
+        # Serializes runs on a shared agent; they would fight over self.page
+        self.lock = asyncio.Lock()
+        self.client = genai.Client(
+            api_key=settings.gemini_api_key,
+            http_options=types.HttpOptions(async_client_args=GEMINI_ASYNC_CLIENT_ARGS)
+        )
     
     async def start(self) -> None:
-        """Start the browser."""
+        """Start the browser. Does nothing if it is already running."""
+        if self.page and not self.page.is_closed():
+            return
+        if self.playwright:
+            # The window was closed under us; start over
+            await self.stop()
+        
         await self.callback.on_log("Starting browser...")
         
+        # Open the Gemini connection while Chromium launches
+        warm_up = asyncio.create_task(self._warm_up_gemini())
+        
         self.playwright = await async_playwright().start()
         self.context = await self.playwright.chromium.launch_persistent_context(
             user_data_dir=str(self.user_data_dir),
             headless=self.headless,
             # Match viewport to window size exactly
             viewport=None, 
-            args=['--start-maximized', '--disable-blink-features=AutomationControlled']
+            args=['--start-maximized', *CHROMIUM_ARGS],
+            ignore_default_args=['--enable-automation']
         )
+        # Install the SOM helpers in every document the context loads, so
+        # screenshots only have to call into them
+        await self.context.add_init_script(script=SOM_SCRIPT_LOADER)
         self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+        # The restored page was loaded before the init script existed
+        await self.page.evaluate(SOM_SCRIPT_LOADER)
         
+        await warm_up
         await self.callback.on_log("Browser ready")
     
+    async def _warm_up_gemini(self) -> None:
+        """
+        Send a one-token request so the first real lookup finds the TLS
+        connection (and HTTP/2 session) to Gemini already open.
+        """
+        try:
+            await self.client.aio.models.generate_content(
+                model=BADGE_LOOKUP_MODEL,
+                contents="ping",
+                config=types.GenerateContentConfig(max_output_tokens=1)
+            )
+        except Exception:
+            pass  # Only a warm-up; real calls report their own errors
+    
+    async def claim(self, callback: Optional[AgentCallback], headless: bool) -> None:
+        """
+        Point a shared agent at a new run's callback and browser mode.
+        
+        Must be called with self.lock held, so a run in progress never has
+        its browser stopped or its events redirected.
+        """
+        self.callback = callback or AgentCallback()
+        if self.headless != headless:
+            await self.stop()
+            self.headless = headless
+    
     async def stop(self) -> None:
         """Stop the browser."""
+        if self.browser:
+            await self.browser.close()
         if self.context:
             await self.context.close()
         if self.playwright:
             await self.playwright.stop()
+        self.browser = self.context = self.playwright = self.page = None
         await self.callback.on_log("Browser stopped")
     
     async def execute_goals(self, goals: List[str]) -> None:
@@ -140,10 +353,61 @@ class AgenticExecutor:
             
             await asyncio.sleep(1)  # Brief pause between goals
     
+    async def execute_goals_parallel(self, goals: List[str], concurrency: int = 4) -> None:
+        """
+        Execute independent goals concurrently, each in a fresh browser context.
+        
+        The contexts share one headless Chromium instance but not the
+        persistent profile, so goals start logged out and on a blank page;
+        use execute_goals for goals that depend on each other or on a session.
+        """
+        await self.callback.on_log(
+            f"Executing {len(goals)} goals in parallel (up to {concurrency} at once)..."
+        )
+        
+        if self.browser is None:
+            self.browser = await self.playwright.chromium.launch(
+                headless=True,
+                args=CHROMIUM_ARGS,
+                ignore_default_args=['--enable-automation']
+            )
+        
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def run(goal: str) -> bool:
+            async with sem:
+                context = await self.browser.new_context(viewport=PARALLEL_VIEWPORT)
+                try:
+                    await context.add_init_script(script=SOM_SCRIPT_LOADER)
+                    page = await context.new_page()
+                    await self.callback.on_goal_start(goal)
+                    success = await self._achieve_goal_on(page, goal)
+                except Exception as e:
+                    await self.callback.on_error(f"Goal failed: {goal}: {e}")
+                    return False
+                finally:
+                    await context.close()
+            
+            if success:
+                await self.callback.on_goal_complete(goal)
+                await self.callback.on_log(f"✅ Goal achieved: {goal}")
+            else:
+                await self.callback.on_error(f"Failed to achieve: {goal}")
+            return success
+        
+        results = await asyncio.gather(*(run(goal) for goal in goals))
+        
+        failed = [goal for goal, success in zip(goals, results) if not success]
+        if failed:
+            raise RuntimeError(f"Failed to achieve goals: {failed}")
+    
     async def execute_plan(self, plan: ExecutionPlan) -> None:
         """Execute a plan step by step - directly for known actions, agent for clicks."""
         await self.callback.on_log(f"Executing {len(plan.steps)} steps...")
         
+        # Badges resolved ahead of time for upcoming TYPE steps, by step id
+        resolved_badges: dict[int, dict] = {}
+        
         for i, step in enumerate(plan.steps, 1):
             await self.callback.on_goal_start(step.description)
             await self.callback.on_log(f"\n🎯 Step {i}/{len(plan.steps)}: {step.action_type} - {step.description}")
@@ -153,11 +417,21 @@ class AgenticExecutor:
                 if step.action_type == "NAVIGATE":
                     await self.page.goto(step.value, wait_until="domcontentloaded")
                     await self.callback.on_action("NAVIGATE", step.value)
-                    await asyncio.sleep(2)  # Wait for page to load
+                    await self._settle(self.page, "networkidle", NETWORK_IDLE_TIMEOUT_MS)
                 
                 elif step.action_type == "TYPE":
-                    # Find the input using agent, then type
-                    await self._type_in_input(step.value, step.description)
+                    # Resolve the whole run of form fields from one screenshot
+                    if step.id not in resolved_badges:
+                        run = self._type_run(plan.steps[i - 1:])
+                        if len(run) > 1:
+                            resolved_badges.update(await self._batch_resolve_badges(run))
+                    
+                    # Find the input using agent (unless already resolved), then type
+                    await self._type_in_input(
+                        step.value,
+                        step.description,
+                        badge=resolved_badges.pop(step.id, None)
+                    )
                 
                 elif step.action_type == "CLICK":
                     # HYBRID STRATEGY: Try text/selector matching first (100% accurate)
@@ -165,19 +439,7 @@ class AgenticExecutor:
                     clicked_via_text = False
                     
                     if text_to_click and len(text_to_click) < 50:
-                        try:
-                            # Try finding by exact text or accessible role
-                            await self.page.click(f"text={text_to_click}", timeout=2000)
-                            await self.callback.on_action("CLICK", f"Text '{text_to_click}'")
-                            clicked_via_text = True
-                        except:
-                            try:
-                                # Try fuzzy match? Or just fall back to vision
-                                await self.page.click(f"text=/{text_to_click}/i", timeout=1000)
-                                await self.callback.on_action("CLICK", f"Text (fuzzy) '{text_to_click}'")
-                                clicked_via_text = True
-                            except:
-                                pass # Fall back to agent
+                        clicked_via_text = await self._click_by_text(text_to_click, step.description)
                     
                     if not clicked_via_text:
                         # Use visually grounded click (direct, no agentic loop)
@@ -201,12 +463,50 @@ class AgenticExecutor:
                 await self.callback.on_error(f"Step failed: {e}")
                 raise
             
-            await asyncio.sleep(0.5)
+            await self._settle(self.page)
 
+    async def _click_by_text(self, text: str, description: str) -> bool:
+        """
+        Click the element showing text, if it can be told apart without vision.
+        
+        Matches are counted before clicking, so text that is missing or
+        ambiguous costs a DOM query rather than a click timeout.
+        
+        Returns:
+            True if an element was clicked
+        """
+        role = next(
+            (role for hint, role in ROLE_HINTS.items()
+             if re.search(rf"\b{hint}\b", description, re.IGNORECASE)),
+            None
+        )
+        fuzzy = re.compile(re.escape(text), re.IGNORECASE)
+        
+        for label, locator in (
+            ("Text", self.page.get_by_text(text, exact=True)),
+            ("Text (fuzzy)", self.page.get_by_text(fuzzy)),
+        ):
+            count = await locator.count()
+            if count > 1 and role:
+                # Several matches: narrow down to the role the step mentions
+                locator = self.page.get_by_role(role, name=fuzzy)
+                count = await locator.count()
+            if count != 1:
+                continue
+            
+            try:
+                await locator.click(timeout=1000)
+            except PlaywrightTimeoutError:
+                continue  # Present but not clickable (hidden, covered)
+            await self.callback.on_action("CLICK", f"{label} '{text}'")
+            return True
+        
+        return False
+    
     async def _click_element(self, description: str, text_hint: Optional[str] = None) -> None:
         """Find an element visually and click it directly (no planning loop)."""
         # Take screenshot with badges
-        screenshot_b64 = await self._capture_screen_with_badges()
+        screenshot, badges = await self._capture_screen_bytes(self.page)
         
         # Ask AI which element to click
         prompt = f"""Look at this screenshot with numbered pink badges on interactive elements.
@@ -215,31 +515,27 @@ I need to CLICK on an element.
 Description: {description}
 {f"Text Hint: {text_hint}" if text_hint else ""}
 
-Which badge number is the element I should click?
-Respond with ONLY the badge number (e.g., "5")."""
+Which badge number is the element I should click?"""
         
-        response = self.client.models.generate_content(
-            model="gemini-pro-latest",
+        response = await self.client.aio.models.generate_content(
+            model=BADGE_LOOKUP_MODEL,
             contents=[
                 types.Part.from_bytes(
-                    data=base64.b64decode(screenshot_b64),
-                    mime_type="image/png"
+                    data=screenshot,
+                    mime_type="image/jpeg"
                 ),
                 prompt
-            ]
+            ],
+            config=BADGE_LOOKUP_CONFIG
         )
         
-        response_text = response.text.strip()
-        await self.callback.on_log(f"Found element at badge: {response_text}")
-        
-        # Extract badge number
-        import re
-        numbers = re.findall(r'\d+', response_text)
-        if not numbers:
+        try:
+            badge_id = BadgeChoice.model_validate_json(response.text).badge
+        except (ValidationError, TypeError):
             raise ValueError(f"Could not find element: {description}")
+        await self.callback.on_log(f"Found element at badge: {badge_id}")
         
-        badge_id = int(numbers[0])
-        badge = self._find_badge(badge_id)
+        badge = badges.get(badge_id)
         
         if not badge:
             raise ValueError(f"Badge {badge_id} not found")
@@ -251,61 +547,90 @@ Respond with ONLY the badge number (e.g., "5")."""
         await self.callback.on_action("CLICK", f"Badge {badge_id}")
         
         # Wait for potential navigation
-        try:
-            await self.page.wait_for_load_state("networkidle", timeout=3000)
-        except:
-            pass
+        await self._settle(self.page, "networkidle", NETWORK_IDLE_TIMEOUT_MS)
 
     
-    async def _type_in_input(self, text: str, description: str) -> None:
-        """Find an input field and type text into it."""
-        # Take screenshot with badges
-        screenshot_b64 = await self._capture_screen_with_badges()
+    @staticmethod
+    def _type_run(steps: List[ActionStep]) -> List[ActionStep]:
+        """
+        Leading run of TYPE steps that can share one screenshot.
         
-        # Ask AI which input to type into
+        Typing leaves the page layout alone, so consecutive fields can be
+        located together; the run ends at the first step that submits with
+        Enter, since that may navigate away.
+        """
+        run = []
+        for step in steps:
+            if step.action_type != "TYPE":
+                break
+            run.append(step)
+            value = step.value or ""
+            if value.endswith("\\n") or value.endswith("\n"):
+                break
+        return run
+    
+    async def _batch_resolve_badges(self, steps: List[ActionStep]) -> dict[int, dict]:
+        """
+        Locate the input fields for several TYPE steps with a single Gemini call.
+        
+        Returns:
+            Badge per step id. Steps the model could not place are left out
+            and get resolved individually when they run.
+        """
+        screenshot, badges = await self._capture_screen_bytes(self.page)
+        
+        step_list = "\n".join(f"Step {step.id}: TYPE into '{step.description}'" for step in steps)
         prompt = f"""Look at this screenshot with numbered pink badges on interactive elements.
 
-I need to TYPE into an input field.
-Description: {description}
+I need to TYPE into several input fields, in this order:
+{step_list}
 
-Which badge number is the INPUT FIELD I should type into?
-Respond with ONLY the badge number (e.g., "5")."""
+For each step, which badge number is the INPUT FIELD to type into?
+Respond with JSON like {{"choices": [{{"step": 1, "badge": 7}}, {{"step": 2, "badge": 12}}]}}."""
         
-        response = self.client.models.generate_content(
-            model="gemini-pro-latest",
+        response = await self.client.aio.models.generate_content(
+            model=BADGE_LOOKUP_MODEL,
             contents=[
                 types.Part.from_bytes(
-                    data=base64.b64decode(screenshot_b64),
-                    mime_type="image/png"
+                    data=screenshot,
+                    mime_type="image/jpeg"
                 ),
                 prompt
-            ]
+            ],
+            config=BADGE_BATCH_LOOKUP_CONFIG
         )
         
-        response_text = response.text.strip()
-        await self.callback.on_log(f"Found input at badge: {response_text}")
-        
-        # Extract badge number
-        import re
-        numbers = re.findall(r'\d+', response_text)
-        if not numbers:
-            raise ValueError(f"Could not find input field: {description}")
+        try:
+            choices = BadgeBatchChoice.model_validate_json(response.text).choices
+        except (ValidationError, TypeError):
+            return {}
         
-        badge_id = int(numbers[0])
-        badge = self._find_badge(badge_id)
+        step_ids = {step.id for step in steps}
+        resolved = {}
+        for choice in choices:
+            badge = badges.get(choice.badge)
+            if choice.step in step_ids and badge:
+                resolved[choice.step] = badge
         
-        if not badge:
-            raise ValueError(f"Badge {badge_id} not found")
+        await self.callback.on_log(
+            f"Located {len(resolved)}/{len(steps)} input fields in one pass"
+        )
+        return resolved
+    
+    async def _type_in_input(
+        self,
+        text: str,
+        description: str,
+        badge: Optional[dict] = None
+    ) -> None:
+        """Find an input field (unless its badge is given) and type text into it."""
+        if badge is None:
+            badge = await self._locate_input(description)
         
         # Click on the input
         x = badge["rect"]["x"] + badge["rect"]["width"] / 2
         y = badge["rect"]["y"] + badge["rect"]["height"] / 2
-        await self.page.mouse.click(x, y)
-        await asyncio.sleep(0.3)
-        
-        # Clear existing text
-        await self.page.keyboard.press("Control+a")
-        await asyncio.sleep(0.1)
+        await self._focus_and_clear(self.page, x, y)
         
         # Type the text
         should_press_enter = False
@@ -319,22 +644,90 @@ Respond with ONLY the badge number (e.g., "5")."""
             await asyncio.sleep(0.2)
             await self.page.keyboard.press("Enter")
             await self.callback.on_action("TYPE", f"'{text}' + Enter")
-            await asyncio.sleep(2)  # Wait for results/navigation
+            # Wait for results/navigation
+            await self._settle(self.page, "networkidle", NETWORK_IDLE_TIMEOUT_MS)
         else:
             await self.callback.on_action("TYPE", f"'{text}'")
     
+    async def _focus_and_clear(self, page: Page, x: float, y: float) -> None:
+        """Click into the input at (x, y) and clear it, unless it is already empty."""
+        await page.mouse.click(x, y)
+        try:
+            await page.wait_for_function(TEXT_FIELD_FOCUSED_SCRIPT, timeout=500)
+        except PlaywrightTimeoutError:
+            pass  # Not a plain text field; type into whatever has focus
+        
+        if await page.evaluate(FOCUSED_FIELD_VALUE_SCRIPT):
+            await page.keyboard.press("Control+a")
+            await page.keyboard.press("Delete")
+    
+    async def _locate_input(self, description: str) -> dict:
+        """Ask Gemini which badge is the input field matching description."""
+        # Take screenshot with badges
+        screenshot, badges = await self._capture_screen_bytes(self.page)
+        
+        # Ask AI which input to type into
+        prompt = f"""Look at this screenshot with numbered pink badges on interactive elements.
+
+I need to TYPE into an input field.
+Description: {description}
+
+Which badge number is the INPUT FIELD I should type into?"""
+        
+        response = await self.client.aio.models.generate_content(
+            model=BADGE_LOOKUP_MODEL,
+            contents=[
+                types.Part.from_bytes(
+                    data=screenshot,
+                    mime_type="image/jpeg"
+                ),
+                prompt
+            ],
+            config=BADGE_LOOKUP_CONFIG
+        )
+        
+        try:
+            badge_id = BadgeChoice.model_validate_json(response.text).badge
+        except (ValidationError, TypeError):
+            raise ValueError(f"Could not find input field: {description}")
+        await self.callback.on_log(f"Found input at badge: {badge_id}")
+        
+        badge = badges.get(badge_id)
+        
+        if not badge:
+            raise ValueError(f"Badge {badge_id} not found")
+        
+        return badge
+    
     async def _achieve_goal(self, goal: str) -> bool:
-        """Try to achieve a single goal through multiple actions."""
+        """Try to achieve a single goal on the main page."""
+        return await self._achieve_goal_on(self.page, goal)
+    
+    async def _achieve_goal_on(self, page: Page, goal: str) -> bool:
+        """
+        Try to achieve a single goal on page through multiple actions.
+        
+        All state lives in locals, so several goals can run concurrently on
+        different pages.
+        """
         
         # Track action history to detect loops
         action_history = []
         
+        # (fingerprint, screenshot, badges) of the last capture
+        last_capture = None
+        
         for attempt in range(self.max_actions_per_goal):
-            # Capture current screen state
-            screenshot_b64 = await self._capture_screen_with_badges()
+            # Capture current screen state, unless the page hasn't changed
+            fingerprint = await page.evaluate(DOM_FINGERPRINT_SCRIPT)
+            if last_capture and last_capture[0] == fingerprint:
+                screenshot, badges = last_capture[1:]
+            else:
+                screenshot, badges = await self._capture_screen_bytes(page)
+                last_capture = (fingerprint, screenshot, badges)
             
             # Ask AI what to do, including action history
-            action = await self._decide_action(goal, screenshot_b64, action_history)
+            action = await self._decide_action(goal, screenshot, badges, action_history)
             
             if action["type"] == "DONE":
                 return True
@@ -342,7 +735,7 @@ Respond with ONLY the badge number (e.g., "5")."""
             if action["type"] == "FAIL":
                 reason = action.get('reason', 'Unknown')
                 await self.callback.on_error(f"Agent decided to fail: {reason}")
-                await self._save_debug_screenshot(f"fail_{goal[:10]}")
+                await self._save_debug_screenshot(page, f"fail_{goal[:10]}")
                 return False
             
             # Detect loops - if same action repeated 3 times, try something else
@@ -351,41 +744,100 @@ Respond with ONLY the badge number (e.g., "5")."""
             
             if len(action_history) >= 3 and action_history[-1] == action_history[-2] == action_history[-3]:
                 await self.callback.on_log("⚠️ Loop detected! Same action repeated 3 times. Moving on.")
-                await self._save_debug_screenshot(f"loop_{goal[:10]}")
+                await self._save_debug_screenshot(page, f"loop_{goal[:10]}")
                 return True  # Consider goal achieved to break the loop
             
             # Execute the action
+            if action["type"] in PAGE_MUTATING_ACTIONS:
+                last_capture = None
             try:
-                await self._execute_action(action)
+                await self._execute_action(page, action, badges)
             except Exception as e:
                 await self.callback.on_error(f"Action failed: {e}")
-                await self._save_debug_screenshot(f"error_{goal[:10]}")
+                await self._save_debug_screenshot(page, f"error_{goal[:10]}")
                 # Continue trying next action
             
             # Wait for page to settle
-            await asyncio.sleep(1)
+            await self._settle(page)
         
         await self.callback.on_error(f"Max actions ({self.max_actions_per_goal}) reached without achieving goal")
-        await self._save_debug_screenshot(f"timeout_{goal[:10]}")
+        await self._save_debug_screenshot(page, f"timeout_{goal[:10]}")
         return False
     
-    async def _capture_screen_with_badges(self) -> str:
-        """Inject badges and capture screenshot."""
-        # Ensure global script is loaded
-        await self.page.evaluate(SOM_SCRIPT_LOADER)
+    async def _settle(
+        self,
+        page: Page,
+        state: str = "domcontentloaded",
+        timeout: float = SETTLE_TIMEOUT_MS
+    ) -> None:
+        """Wait for page to reach a load state, giving up after timeout ms."""
+        try:
+            await page.wait_for_load_state(state, timeout=timeout)
+        except PlaywrightTimeoutError:
+            pass  # Still loading; carry on with what is rendered
+    
+    async def _cdp_session(self, page: Page) -> CDPSession:
+        """CDP session for page, opened on first use and kept for its lifetime."""
+        session = self._cdp_sessions.get(page)
+        if session is None:
+            session = await page.context.new_cdp_session(page)
+            self._cdp_sessions[page] = session
+        return session
+    
+    @staticmethod
+    async def _cdp_evaluate(cdp: CDPSession, expression: str):
+        """Evaluate expression in the page over CDP and return its value."""
+        response = await cdp.send("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+        })
+        if "exceptionDetails" in response:
+            details = response["exceptionDetails"]
+            raise RuntimeError(details.get("exception", {}).get("description") or details["text"])
+        return response["result"].get("value")
+    
+    async def _capture_screen_bytes(self, page: Page) -> tuple[bytes, Badges]:
+        """
+        Inject badges and capture a downscaled JPEG screenshot and the badges.
+        
+        Everything goes over the page's CDP session; badge cleanup runs
+        while the screenshot is decoded instead of before it.
+        """
+        cdp = await self._cdp_session(page)
         
-        # Inject badges
-        badges = await self.page.evaluate("window.DooleySOM.inject()")
-        screenshot_bytes = await self.page.screenshot()
-        # Cleanup
-        await self.page.evaluate("window.DooleySOM.cleanup()")
+        # Inject badges (DooleySOM is installed by the context's init script)
+        raw_badges, metrics = await asyncio.gather(
+            self._cdp_evaluate(cdp, "window.DooleySOM.inject()"),
+            cdp.send("Page.getLayoutMetrics")
+        )
+        # JPEG skips PNG's zlib pass; the model doesn't need lossless pixels.
+        # The clip's scale has the browser render at the final size, so the
+        # image is encoded once instead of being decoded and re-encoded here.
+        result = await cdp.send("Page.captureScreenshot", {
+            **CDP_SCREENSHOT_PARAMS,
+            "clip": screenshot_clip(metrics)
+        })
+        cleanup = asyncio.create_task(self._cdp_evaluate(cdp, "window.DooleySOM.cleanup()"))
+        
+        # CDP hands back base64; decode it once, Gemini takes raw bytes
+        screenshot_bytes = base64.b64decode(result["data"])
+        await cleanup
         
-        # Store badges for reference
-        self._current_badges = badges
+        # Index once per capture; the prompt label is cut here, not per lookup
+        badges = {}
+        for badge in raw_badges:
+            badge["label"] = (badge.get("text") or "")[:BADGE_LABEL_LENGTH]
+            badges[badge["id"]] = badge
         
-        return base64.b64encode(screenshot_bytes).decode()
+        return screenshot_bytes, badges
     
-    async def _decide_action(self, goal: str, screenshot_b64: str, action_history: list) -> dict:
+    async def _decide_action(
+        self,
+        goal: str,
+        screenshot: bytes,
+        badges: Badges,
+        action_history: list
+    ) -> dict:
         """Ask AI what action to take to achieve the goal."""
         
         # Include recent action history to help avoid loops
@@ -396,9 +848,9 @@ Respond with ONLY the badge number (e.g., "5")."""
         
         # Build badge list with regions for context
         badge_list = ""
-        if hasattr(self, '_current_badges') and self._current_badges:
-            badge_info = [f"  {b['id']}: [{b.get('region', 'unknown')}] {b.get('text', '')[:50]}" 
-                          for b in self._current_badges[:30]]  # Top 30 badges
+        if badges:
+            badge_info = [f"  {b['id']}: [{b.get('region', 'unknown')}] {b['label']}" 
+                          for b in self._rank_badges(goal, badges)]
             badge_list = "\n\nELEMENTS WITH REGIONS:\n" + "\n".join(badge_info)
         
         prompt = f"""You are a browser automation agent. Look at this screenshot with numbered pink badges.
@@ -425,157 +877,147 @@ TIPS:
 - If goal says "search result" or "main", look in "main-content" region
 - If the element was clicked and page changed, say DONE
 
-Respond with EXACTLY ONE line:
-ACTION_TYPE [parameters]"""
+Respond with the action type, plus "badge" for CLICK or "reason" for FAIL."""
 
-        response = self.client.models.generate_content(
+        response = await self.client.aio.models.generate_content(
             model="gemini-2.0-flash",
             contents=[
                 types.Part.from_bytes(
-                    data=base64.b64decode(screenshot_b64),
-                    mime_type="image/png"
+                    data=screenshot,
+                    mime_type="image/jpeg"
                 ),
                 prompt
-            ]
+            ],
+            config=DECISION_CONFIG
         )
         
-        response_text = response.text.strip().split('\n')[0]  # Take first line only
-        await self.callback.on_log(f"Agent decision: {response_text}")
-        
-        return self._parse_action(response_text)
-    
-    def _parse_action(self, response: str) -> dict:
-        """Parse the AI's action response."""
-        parts = response.strip().split(' ', 2)
-        action_type = parts[0].upper()
-        
-        if action_type == "CLICK" and len(parts) >= 2:
-            try:
-                badge_num = int(parts[1])
-                return {"type": "CLICK", "badge": badge_num}
-            except ValueError:
-                return {"type": "FAIL", "reason": f"Invalid badge number: {parts[1]}"}
-        
-        elif action_type == "TYPE" and len(parts) >= 3:
-            try:
-                badge_num = int(parts[1])
-                text = parts[2]
-                return {"type": "TYPE", "badge": badge_num, "text": text}
-            except ValueError:
-                return {"type": "FAIL", "reason": f"Invalid badge number: {parts[1]}"}
+        try:
+            decision = AgentDecision.model_validate_json(response.text)
+        except (ValidationError, TypeError):
+            return {"type": "FAIL", "reason": f"Unreadable decision: {response.text}"}
         
-        elif action_type == "NAVIGATE" and len(parts) >= 2:
-            url = parts[1]
-            if not url.startswith("http"):
-                url = f"https://{url}"
-            return {"type": "NAVIGATE", "url": url}
+        await self.callback.on_log(f"Agent decision: {decision.model_dump_json(exclude_none=True)}")
         
-        elif action_type == "SCROLL":
-            direction = parts[1] if len(parts) >= 2 else "down"
-            return {"type": "SCROLL", "direction": direction}
+        if decision.type == "NAVIGATE" and decision.url and not decision.url.startswith("http"):
+            decision.url = f"https://{decision.url}"
         
-        elif action_type == "WAIT":
-            return {"type": "WAIT"}
+        return decision.model_dump(exclude_none=True)
+    
+    @staticmethod
+    def _rank_badges(goal: str, badges: Badges) -> list[dict]:
+        """
+        Pick the badges most likely to matter for goal, best first.
         
-        elif action_type == "DONE":
-            return {"type": "DONE"}
+        A badge scores a point per goal word found in its label, plus 3 if
+        it sits in a region the goal mentions. Ties keep page order. Only
+        the prompt list is trimmed; any badge can still be acted on.
+        """
+        goal = goal.lower()
+        words = [word for word in re.findall(r"\w+", goal) if len(word) > 2]
+        regions = [region for hint, region in REGION_HINTS.items() if hint in goal]
         
-        elif action_type == "FAIL":
-            reason = ' '.join(parts[1:]) if len(parts) > 1 else "Unknown"
-            return {"type": "FAIL", "reason": reason}
+        def score(badge: dict) -> int:
+            label = badge["label"].lower()
+            points = sum(word in label for word in words)
+            if any(region in badge.get("region", "") for region in regions):
+                points += 3
+            return points
         
+        return sorted(badges.values(), key=score, reverse=True)[:PROMPT_BADGE_LIMIT]
+    
+    async def _execute_action(self, page: Page, action: dict, badges: Badges) -> None:
+        """Execute a single action on page, resolving badges from its last capture."""
+        handler = self._ACTION_HANDLERS.get(action["type"])
+        if handler:
+            await handler(self, page, action, badges)
+    
+    async def _do_click(self, page: Page, action: dict, badges: Badges) -> None:
+        """CLICK: click the center of the chosen badge."""
+        badge = badges.get(action["badge"])
+        if badge:
+            # Verify text match if provided (prevents clicking wrong links)
+            expected_text = action.get("text_hint")
+            if expected_text:
+                badge_text = badge.get("text", "").lower()
+                if expected_text.lower() not in badge_text and badge_text not in expected_text.lower():
+                    await self.callback.on_log(f"⚠️ Warning: Click target '{badge_text}' might not match '{expected_text}'")
+            
+            x = badge["rect"]["x"] + badge["rect"]["width"] / 2
+            y = badge["rect"]["y"] + badge["rect"]["height"] / 2
+            await page.mouse.click(x, y)
+            await self.callback.on_action("CLICK", f"Badge {action['badge']} at ({x:.0f}, {y:.0f})")
+            
+            # Wait a bit longer and check for navigation
+            await self._settle(page, "networkidle", 2000)
         else:
-            return {"type": "FAIL", "reason": f"Unknown action: {response}"}
-    
-    async def _execute_action(self, action: dict) -> None:
-        """Execute a single action."""
-        action_type = action["type"]
-        
-        if action_type == "CLICK":
-            badge = self._find_badge(action["badge"])
-            if badge:
-                # Verify text match if provided (prevents clicking wrong links)
-                expected_text = action.get("text_hint")
-                if expected_text:
-                    badge_text = badge.get("text", "").lower()
-                    if expected_text.lower() not in badge_text and badge_text not in expected_text.lower():
-                        await self.callback.on_log(f"⚠️ Warning: Click target '{badge_text}' might not match '{expected_text}'")
-                
-                x = badge["rect"]["x"] + badge["rect"]["width"] / 2
-                y = badge["rect"]["y"] + badge["rect"]["height"] / 2
-                await self.page.mouse.click(x, y)
-                await self.callback.on_action("CLICK", f"Badge {action['badge']} at ({x:.0f}, {y:.0f})")
-                
-                # Wait a bit longer and check for navigation
-                try:
-                    await self.page.wait_for_load_state("networkidle", timeout=2000)
-                except:
-                    pass  # Ignore timeout, page might not have navigated
-            else:
-                raise ValueError(f"Badge {action['badge']} not found")
-        
-        elif action_type == "TYPE":
-            # ... (Type logic is fine)
-            badge = self._find_badge(action["badge"])
-            if badge:
-                x = badge["rect"]["x"] + badge["rect"]["width"] / 2
-                y = badge["rect"]["y"] + badge["rect"]["height"] / 2
-                await self.page.mouse.click(x, y)
-                await asyncio.sleep(0.3)
-                
-                # Clear any existing text first
-                await self.page.keyboard.press("Control+a")
-                await asyncio.sleep(0.1)
-                
-                text = action["text"]
-                should_press_enter = False
-                
-                # Check if text ends with \n (escape sequence or actual)
-                if text.endswith("\\n") or text.endswith("\n"):
-                    text = text.rstrip("\\n").rstrip("\n")
-                    should_press_enter = True
-                
-                # Auto-press Enter if it's a search input
-                if badge.get("type") == "search" or "search" in badge.get("text", "").lower():
-                    should_press_enter = True
-                
-                await self.page.keyboard.type(text)
-                
-                if should_press_enter:
-                    await asyncio.sleep(0.2)
-                    await self.page.keyboard.press("Enter")
-                    await self.callback.on_action("TYPE", f"'{text}' + Enter")
-                    try:
-                        await self.page.wait_for_load_state("networkidle", timeout=3000)
-                    except:
-                        pass
-                else:
-                    await self.callback.on_action("TYPE", f"'{text}'")
-            else:
-                raise ValueError(f"Badge {action['badge']} not found")
-
-        elif action_type == "NAVIGATE":
-            await self.page.goto(action["url"], wait_until="domcontentloaded")
-            await self.callback.on_action("NAVIGATE", action["url"])
-        
-        elif action_type == "SCROLL":
-            direction = action.get("direction", "down")
-            if direction == "down":
-                await self.page.evaluate("window.scrollBy(0, 500)")
+            raise ValueError(f"Badge {action['badge']} not found")
+    
+    async def _do_type(self, page: Page, action: dict, badges: Badges) -> None:
+        """TYPE: focus the chosen badge and type the text."""
+        badge = badges.get(action["badge"])
+        if badge:
+            x = badge["rect"]["x"] + badge["rect"]["width"] / 2
+            y = badge["rect"]["y"] + badge["rect"]["height"] / 2
+            await self._focus_and_clear(page, x, y)
+            
+            text = action["text"]
+            should_press_enter = False
+            
+            # Check if text ends with \n (escape sequence or actual)
+            if text.endswith("\\n") or text.endswith("\n"):
+                text = text.rstrip("\\n").rstrip("\n")
+                should_press_enter = True
+            
+            # Auto-press Enter if it's a search input
+            if badge.get("type") == "search" or "search" in badge.get("text", "").lower():
+                should_press_enter = True
+            
+            await page.keyboard.type(text)
+            
+            if should_press_enter:
+                await asyncio.sleep(0.2)
+                await page.keyboard.press("Enter")
+                await self.callback.on_action("TYPE", f"'{text}' + Enter")
+                await self._settle(page, "networkidle", NETWORK_IDLE_TIMEOUT_MS)
             else:
-                await self.page.evaluate("window.scrollBy(0, -500)")
-            await self.callback.on_action("SCROLL", direction)
-        
-        elif action_type == "WAIT":
-            await asyncio.sleep(2)
-            await self.callback.on_action("WAIT", "2 seconds")
+                await self.callback.on_action("TYPE", f"'{text}'")
+        else:
+            raise ValueError(f"Badge {action['badge']} not found")
+    
+    async def _do_navigate(self, page: Page, action: dict, badges: Badges) -> None:
+        """NAVIGATE: open the URL."""
+        await page.goto(action["url"], wait_until="domcontentloaded")
+        await self.callback.on_action("NAVIGATE", action["url"])
+    
+    async def _do_scroll(self, page: Page, action: dict, badges: Badges) -> None:
+        """SCROLL: scroll the viewport up or down."""
+        direction = action.get("direction", "down")
+        if direction == "down":
+            await page.evaluate("window.scrollBy(0, 500)")
+        else:
+            await page.evaluate("window.scrollBy(0, -500)")
+        await self.callback.on_action("SCROLL", direction)
+    
+    async def _do_wait(self, page: Page, action: dict, badges: Badges) -> None:
+        """WAIT: give the page time to update."""
+        await asyncio.sleep(2)
+        await self.callback.on_action("WAIT", "2 seconds")
+    
+    # Agent action type -> handler; DONE and FAIL never reach _execute_action
+    _ACTION_HANDLERS = {
+        "CLICK": _do_click,
+        "TYPE": _do_type,
+        "NAVIGATE": _do_navigate,
+        "SCROLL": _do_scroll,
+        "WAIT": _do_wait,
+    }
 
-    async def _save_debug_screenshot(self, prefix: str) -> str:
+    async def _save_debug_screenshot(self, page: Page, prefix: str) -> str:
         """Save a screenshot for debugging."""
         timestamp = __import__("datetime").datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{prefix}_{timestamp}.png"
         path = self.screenshot_dir / filename
-        await self.page.screenshot(path=path)
+        await page.screenshot(path=path)
         return str(path)
 
     async def interactive_login(self) -> None:
@@ -590,10 +1032,36 @@ ACTION_TYPE [parameters]"""
         await asyncio.to_thread(input, "")
         await self.stop()
 
+
+# Agents kept warm between execute_with_agent calls, by browser profile
+# (Chromium locks a profile to one running instance)
+_agents: dict[Path, AgenticExecutor] = {}
+
+
+async def get_or_create_agent(
+    callback: Optional[AgentCallback] = None,
+    headless: bool = False
+) -> AgenticExecutor:
+    """
+    Get the shared agent for the browser profile, creating it if needed.
     
-    def _find_badge(self, badge_id: int) -> Optional[dict]:
-        """Find a badge by ID."""
-        return next((b for b in self._current_badges if b["id"] == badge_id), None)
+    An existing agent may be in the middle of another caller's run, so it
+    is returned untouched: take agent.lock, then hand it this run's
+    settings with agent.claim() before using it. The agent keeps its
+    browser open between calls; release it with shutdown_agents().
+    """
+    agent = _agents.get(BROWSER_PROFILE_DIR)
+    if agent is None:
+        agent = AgenticExecutor(callback=callback, headless=headless)
+        _agents[BROWSER_PROFILE_DIR] = agent
+    return agent
+
+
+async def shutdown_agents() -> None:
+    """Stop the browsers of all shared agents."""
+    while _agents:
+        _, agent = _agents.popitem()
+        await agent.stop()
 
 
 # Convenience function
@@ -602,11 +1070,10 @@ async def execute_with_agent(
     callback: Optional[AgentCallback] = None,
     headless: bool = False
 ) -> None:
-    """Execute goals using the agentic executor."""
-    agent = AgenticExecutor(callback=callback, headless=headless)
+    """Execute goals using the shared agent, leaving its browser running."""
+    agent = await get_or_create_agent(callback=callback, headless=headless)
     
-    try:
+    async with agent.lock:
+        await agent.claim(callback, headless)
         await agent.start()
         await agent.execute_goals(goals)
-    finally:
-        await agent.stop()
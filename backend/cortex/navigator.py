@@ -6,16 +6,22 @@ This module controls the browser automation using a hybrid approach:
 2. Vision-path: Use Set-of-Mark (SoM) injection + Gemini Flash for visual grounding
 """
 import asyncio
-import base64
-import json
+import hashlib
+import re
+from collections import OrderedDict
 from pathlib import Path
 from typing import Callable, Optional
 
+import cv2
+import numpy as np
 from google import genai
 from google.genai import types
-from playwright.async_api import async_playwright, Page, Browser
+from playwright.async_api import async_playwright, Locator, Page, Browser
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from pydantic import ValidationError
 
-from cortex.schemas import ActionStep, ExecutionPlan
+from cortex.schemas import ActionStep, BadgeChoice, ExecutionPlan, RecoveryDecision, SomClickChoice
 from config import get_settings
 
 
@@ -33,13 +39,131 @@ def load_som_script():
         return """
         window.DooleySOM = {
             inject: () => { return []; },
-            cleanup: () => {}
+            cleanup: () => {},
+            fingerprint: () => location.href,
+            capture: (known) => ({ fingerprint: location.href, badges: [] })
         }
         """
 
 SOM_SCRIPT_LOADER = load_som_script()
 
 
+# Vision input for badge selection: cropped to the badges, shrunk and JPEG'd
+VIEWPORT = {"width": 1920, "height": 1080}
+SOM_CROP_PADDING = 64
+SOM_IMAGE_MAX_SIDE = 1024
+SOM_JPEG_QUALITY = 85
+# Gap between the reference frame and the screenshot in a composite image
+COMPOSITE_DIVIDER = 10
+
+# Post-click waits (ms): a beat for in-page UI (dropdowns, modals), then up
+# to NETWORK_IDLE_TIMEOUT_MS for any navigation it started to go quiet
+UI_SETTLE_MS = 150
+NETWORK_IDLE_TIMEOUT_MS = 2000
+SETTLE_TIMEOUT_MS = 1000
+
+# Steps that can change the page; cached SoM captures are dropped after them
+PAGE_MUTATING_ACTIONS = {"NAVIGATE", "CLICK", "TYPE", "SCROLL"}
+
+# Structured output for each Gemini call; Gemini orders properties
+# alphabetically, so badge_number streams before reasoning
+SOM_CHOICE_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=SomClickChoice
+)
+RECOVERY_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=RecoveryDecision
+)
+ALTERNATIVE_BADGE_CONFIG = types.GenerateContentConfig(
+    temperature=0,
+    response_mime_type="application/json",
+    response_schema=BadgeChoice
+)
+
+# The badge pick, matched as soon as it has streamed in (value must be complete)
+BADGE_NUMBER_PATTERN = re.compile(r'"badge_number"\s*:\s*"?(\d+|NOT_FOUND)[",}\s]')
+
+# Badge picks remembered per navigator, keyed by a hash of model + image + prompt
+BADGE_PICK_CACHE_SIZE = 128
+
+# Upper bound on concurrent Gemini requests per navigator (RPM limits)
+GEMINI_CONCURRENCY = 8
+
+
+def badge_clip(badges: list, viewport: dict) -> Optional[dict]:
+    """Bounding box of all badge rects, padded and clamped to the viewport."""
+    left = max(min(b["rect"]["x"] for b in badges) - SOM_CROP_PADDING, 0)
+    top = max(min(b["rect"]["y"] for b in badges) - SOM_CROP_PADDING, 0)
+    right = min(
+        max(b["rect"]["x"] + b["rect"]["width"] for b in badges) + SOM_CROP_PADDING,
+        viewport["width"]
+    )
+    bottom = min(
+        max(b["rect"]["y"] + b["rect"]["height"] for b in badges) + SOM_CROP_PADDING,
+        viewport["height"]
+    )
+    if right <= left or bottom <= top:
+        return None
+    return {"x": left, "y": top, "width": right - left, "height": bottom - top}
+
+
+def encode_for_vision(png: bytes, clip: Optional[dict] = None, viewport: dict = VIEWPORT) -> bytes:
+    """
+    Crop a PNG viewport screenshot to clip (CSS pixels), shrink it to
+    SOM_IMAGE_MAX_SIDE and re-encode it as JPEG.
+    """
+    image = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode screenshot")
+    
+    if clip:
+        # Screenshot pixels per CSS pixel (the device scale factor)
+        ratio = image.shape[1] / viewport["width"]
+        image = image[
+            round(clip["y"] * ratio):round((clip["y"] + clip["height"]) * ratio),
+            round(clip["x"] * ratio):round((clip["x"] + clip["width"]) * ratio)
+        ]
+    
+    height, width = image.shape[:2]
+    scale = SOM_IMAGE_MAX_SIDE / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (round(width * scale), round(height * scale)),
+            interpolation=cv2.INTER_AREA
+        )
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, SOM_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode screenshot")
+    return encoded.tobytes()
+
+
+def compose_side_by_side(left_jpeg: bytes, right_jpeg: bytes) -> bytes:
+    """
+    Put two JPEGs next to each other in one JPEG, the left one scaled to the
+    right one's height, separated by a white COMPOSITE_DIVIDER gap.
+    """
+    left = cv2.imdecode(np.frombuffer(left_jpeg, np.uint8), cv2.IMREAD_COLOR)
+    right = cv2.imdecode(np.frombuffer(right_jpeg, np.uint8), cv2.IMREAD_COLOR)
+    if left is None or right is None:
+        raise ValueError("Could not decode image")
+    
+    height = right.shape[0]
+    left = cv2.resize(
+        left,
+        (max(round(left.shape[1] * height / left.shape[0]), 1), height),
+        interpolation=cv2.INTER_AREA
+    )
+    divider = np.full((height, COMPOSITE_DIVIDER, 3), 255, np.uint8)
+    ok, encoded = cv2.imencode(
+        ".jpg", np.hstack((left, divider, right)), [cv2.IMWRITE_JPEG_QUALITY, SOM_JPEG_QUALITY]
+    )
+    if not ok:
+        raise ValueError("Could not encode composite image")
+    return encoded.tobytes()
+
+
 class NavigatorCallback:
     """Callbacks for navigator events (for SSE streaming)."""
     
@@ -47,8 +171,8 @@ class NavigatorCallback:
         """Called when a step starts."""
         pass
     
-    async def on_step_complete(self, step: ActionStep, screenshot_b64: str) -> None:
-        """Called when a step completes."""
+    async def on_step_complete(self, step: ActionStep, screenshot: bytes) -> None:
+        """Called when a step completes, with a PNG screenshot of the page."""
         pass
     
     async def on_step_error(self, step: ActionStep, error: str) -> None:
@@ -74,19 +198,31 @@ class Navigator:
         self.headless = headless
         self.screenshot_dir = screenshot_dir or Path("./temp/screenshots")
         self.screenshot_dir.mkdir(parents=True, exist_ok=True)
+        self.debug_dir = Path("debug_screenshots")
+        self.debug_dir.mkdir(exist_ok=True)
         self.persist_session = persist_session
         
         # Persistent profile directory
         self.user_data_dir = Path("./temp/browser_profile")
         self.user_data_dir.mkdir(parents=True, exist_ok=True)
         
+        self.playwright = None
         self.browser: Optional[Browser] = None
         self.context = None
         self.page: Optional[Page] = None
-        self.som_cache: dict = {}  # Cache element data from SoM
+        # Step id -> selector that worked (steps themselves are immutable)
+        self._cached_selectors: dict[int, str] = {}
+        # DOM fingerprint -> (badges, vision JPEG) for the current page state
+        self._som_captures: dict[str, tuple[list, bytes]] = {}
+        # Fire-and-forget work still in flight (kept referenced until done)
+        self._background_tasks: set[asyncio.Task] = set()
         
         # Initialize Gemini Client
         self.client = genai.Client(api_key=settings.gemini_api_key)
+        self.primary_model = settings.primary_vision_model
+        self.fallback_model = settings.fallback_vision_model
+        self.gemini_sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+        self._badge_picks: OrderedDict[bytes, str] = OrderedDict()
     
     async def start(self) -> None:
         """Start the browser."""
@@ -99,13 +235,17 @@ class Navigator:
             self.context = await self.playwright.chromium.launch_persistent_context(
                 user_data_dir=str(self.user_data_dir),
                 headless=self.headless,
-                viewport={"width": 1920, "height": 1080},
+                viewport=VIEWPORT,
                 args=[
                     '--start-maximized',
                     '--disable-blink-features=AutomationControlled'  # Reduces bot detection
                 ]
             )
+            # Install the SoM helpers in every document the context loads
+            await self.context.add_init_script(script=SOM_SCRIPT_LOADER)
             self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+            # The restored page was loaded before the init script existed
+            await self.page.evaluate(SOM_SCRIPT_LOADER)
             
             # Set up dialog handler for browser popups
             self.page.on("dialog", self._handle_dialog)
@@ -117,8 +257,9 @@ class Navigator:
                 headless=self.headless,
                 args=['--start-maximized']
             )
-            self.page = await self.browser.new_page()
-            await self.page.set_viewport_size({"width": 1920, "height": 1080})
+            self.context = await self.browser.new_context(viewport=VIEWPORT)
+            await self.context.add_init_script(script=SOM_SCRIPT_LOADER)
+            self.page = await self.context.new_page()
             
             # Set up dialog handler for browser popups
             self.page.on("dialog", self._handle_dialog)
@@ -137,6 +278,8 @@ class Navigator:
     
     async def stop(self) -> None:
         """Stop the browser."""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
         if self.context:
             await self.context.close()
         if self.browser:
@@ -151,10 +294,43 @@ class Navigator:
         
         for step in plan.steps:
             await self.execute_step(step)
-            await asyncio.sleep(0.5)  # Small delay between steps
         
         await self.callback.on_log("Execution complete!", "success")
     
+    async def execute_parallel_group(self, steps: list[ActionStep]) -> None:
+        """
+        Execute CLICK steps that don't depend on each other's DOM changes.
+        
+        The browser is shared, so screenshots are captured and clicks are
+        performed one step at a time; only the Gemini badge lookups, which
+        dominate the wall time, run concurrently.
+        """
+        for step in steps:
+            if step.action_type != "CLICK":
+                raise ValueError(f"Parallel groups only support CLICK steps, got {step.action_type}")
+        
+        await self.callback.on_log(f"Executing {len(steps)} independent clicks...")
+        
+        captures = []
+        for step in steps:
+            await self.callback.on_step_start(step)
+            captures.append(await self._capture_som(step))
+        
+        badge_vals = await asyncio.gather(*[
+            self._ask_gemini_for_badge(step, screenshot_jpeg)
+            for step, (_, screenshot_jpeg) in zip(steps, captures)
+        ])
+        
+        for step, (badges, screenshot_jpeg), badge_val in zip(steps, captures, badge_vals):
+            try:
+                await self._click_badge(step, badges, screenshot_jpeg, badge_val)
+                await self.callback.on_step_complete(step, await self._capture_screenshot(step.id))
+            except Exception as e:
+                await self.callback.on_step_error(step, str(e))
+                raise
+            finally:
+                self._som_captures.clear()
+    
     async def execute_step(self, step: ActionStep) -> None:
         """Execute a single step."""
         await self.callback.on_step_start(step)
@@ -174,43 +350,45 @@ class Navigator:
             else:
                 raise ValueError(f"Unknown action type: {step.action_type}")
             
-            # Capture screenshot after action
-            screenshot_b64 = await self._capture_screenshot(step.id)
-            await self.callback.on_step_complete(step, screenshot_b64)
+            # Capture screenshot after action and hand it straight to the callback
+            await self.callback.on_step_complete(step, await self._capture_screenshot(step.id))
             
         except Exception as e:
             await self.callback.on_step_error(step, str(e))
             raise
+        finally:
+            if step.action_type in PAGE_MUTATING_ACTIONS:
+                self._som_captures.clear()
     
     async def _execute_navigate(self, step: ActionStep) -> None:
         """Navigate to a URL."""
-        url = step.value
+        url = step.normalized_url
         if not url:
             raise ValueError("NAVIGATE requires a URL in value")
         
-        # Add https if missing
-        if not url.startswith("http"):
-            url = f"https://{url}"
-        
         await self.page.goto(url, wait_until="domcontentloaded")
         await self.callback.on_log(f"Navigated to: {url}")
     
     async def _execute_click(self, step: ActionStep) -> None:
         """Click on an element using fast-path or SoM vision."""
-        # Try cached selector first
-        if step.cached_selector:
-            try:
-                await self.page.click(step.cached_selector, timeout=3000)
-                await self.callback.on_log(f"Clicked (cached): {step.cached_selector}")
-                return
-            except Exception:
-                pass
-        
-        # Try text-based fast-path
+        # Fast paths, keyed by their log line: cached selector, then text.
+        # Both are waited for at once and the first to show up gets the click,
+        # so a miss no longer costs a full timeout before the other is tried.
+        # If that click fails (covered, detached), the other one gets its turn.
+        candidates = {}
+        cached_selector = self._cached_selectors.get(step.id) or step.cached_selector
+        if cached_selector:
+            candidates[f"Clicked (cached): {cached_selector}"] = self.page.locator(cached_selector).first
         if step.value:
+            candidates[f"Clicked (text): {step.value}"] = self.page.get_by_text(step.value, exact=False)
+        
+        while candidates:
+            winner = await self._first_visible(candidates)
+            if not winner:
+                break
             try:
-                await self.page.get_by_text(step.value, exact=False).click(timeout=3000)
-                await self.callback.on_log(f"Clicked (text): {step.value}")
+                await candidates.pop(winner).click(timeout=3000)
+                await self.callback.on_log(winner)
                 return
             except Exception:
                 pass
@@ -218,51 +396,108 @@ class Navigator:
         # Fall back to SoM + Gemini Flash
         await self._click_with_som(step)
     
+    async def _first_visible(self, candidates: dict[str, Locator], timeout: float = 3000) -> Optional[str]:
+        """Key of the first candidate to become visible (earlier keys win ties), or None."""
+        waits = {
+            asyncio.create_task(locator.wait_for(state="visible", timeout=timeout)): key
+            for key, locator in candidates.items()
+        }
+        pending = set(waits)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in waits:
+                    if task in done and task.exception() is None:
+                        return waits[task]
+            return None
+        finally:
+            # Also retrieves the errors of waits that lost the race
+            await asyncio.gather(*(self._discard_task(task) for task in waits))
+    
     async def _click_with_som(self, step: ActionStep) -> None:
         """Use Set-of-Mark + Gemini Flash to find and click element."""
-        await self.callback.on_log("Using SoM vision to find element...")
+        badges, screenshot_jpeg = await self._capture_som(step)
+        badge_val = await self._ask_gemini_for_badge(step, screenshot_jpeg)
+        await self._click_badge(step, badges, screenshot_jpeg, badge_val)
+    
+    async def _capture_som(self, step: ActionStep) -> tuple[list, bytes]:
+        """
+        Inject SoM badges and capture them as a vision-ready JPEG.
         
-        # Ensure global script is loaded
-        await self.page.evaluate(SOM_SCRIPT_LOADER)
+        Captures are cached by DOM fingerprint, so retries on an unchanged
+        page skip the DOM walk and the screenshot. The fingerprint check and
+        the injection share one evaluate (DooleySOM is installed by the
+        context's init script), and cleanup runs in the background.
+        """
+        await self.callback.on_log("Using SoM vision to find element...")
         
-        # Inject badges
-        badges = await self.page.evaluate("window.DooleySOM.inject()")
+        # Inject badges unless this page state was already captured
+        known = list(self._som_captures)
+        try:
+            result = await self.page.evaluate("known => window.DooleySOM.capture(known)", known)
+        except PlaywrightError:
+            # A document the init script didn't reach; install the helpers and retry
+            await self.page.evaluate(SOM_SCRIPT_LOADER)
+            result = await self.page.evaluate("known => window.DooleySOM.capture(known)", known)
+        fingerprint, badges = result["fingerprint"], result["badges"]
+        if badges is None:
+            await self.callback.on_log("Page unchanged, reusing SoM capture")
+            return self._som_captures[fingerprint]
         
         if not badges:
             raise ValueError("No interactive elements found on page")
         
         await self.callback.on_log(f"Found {len(badges)} interactive elements")
         
-        # Capture screenshot with badges
+        # Capture screenshot with badges. The full-resolution PNG is only
+        # kept for the debug save; Gemini gets the badge region as a small JPEG
+        # (image tokens scale with area). Badge rects stay in page space.
         screenshot_bytes = await self.page.screenshot()
-        screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
+        
+        # Badges are in the pixels now; nothing below needs them on the page.
+        # Cleanup, the debug save and the JPEG encode all overlap, and the
+        # Gemini request goes out as soon as the encode is done.
+        self._run_in_background(self.page.evaluate("window.DooleySOM.cleanup()"))
         
         # Save debug screenshot for user inspection
-        debug_dir = Path("debug_screenshots")
-        debug_dir.mkdir(exist_ok=True)
-        debug_path = debug_dir / f"step_{step.id}_som.png"
-        with open(debug_path, "wb") as f:
-            f.write(screenshot_bytes)
-        await self.callback.on_log(f"Saved debug screenshot to {debug_path}")
+        debug_path = self.debug_dir / f"step_{step.id}_som.png"
+        self._write_in_background(debug_path, screenshot_bytes)
         
-        # Clean up badges
-        await self.page.evaluate("window.DooleySOM.cleanup()")
+        viewport = self.page.viewport_size or VIEWPORT
+        screenshot_jpeg = await asyncio.to_thread(
+            encode_for_vision, screenshot_bytes, badge_clip(badges, viewport), viewport
+        )
+        await self.callback.on_log(f"Saving debug screenshot to {debug_path}")
         
+        self._som_captures[fingerprint] = (badges, screenshot_jpeg)
+        return badges, screenshot_jpeg
+    
+    async def _ask_gemini_for_badge(self, step: ActionStep, screenshot_jpeg: bytes) -> str:
+        """Ask Gemini which badge to click. Returns the badge number or "NOT_FOUND"."""
         # Ask Gemini Flash which badge to click
         # Better prompt with context
         target_hint = ""
         if step.value:
             target_hint = f"\nLOOK FOR TEXT: '{step.value}'"
         
-        # Add excluded badges from previous failed attempts
+        # Add excluded badges from previous failed attempts; a re-pick after a
+        # wrong click escalates to the larger model
+        model = self.primary_model
         excluded_hint = ""
         if hasattr(self, '_excluded_badges') and step.id in self._excluded_badges:
             excluded = self._excluded_badges[step.id]
             excluded_hint = f"\n\n⚠️ PREVIOUSLY CLICKED (WRONG - DO NOT SELECT AGAIN): Badges {excluded}"
+            model = self.fallback_model
             
-        prompt = f"""Look at the following images:
-1. The SCREENSHOT of the current page with numbered pink badges.
-{ "2. A REFERENCE FRAME showing the element to click (from a video)." if step.visual_context else "" }
+        if step.visual_context:
+            images_hint = """Look at the following image. It has two parts:
+LEFT: A REFERENCE FRAME showing the element to click (from a video), with the mouse cursor.
+RIGHT: The SCREENSHOT of the current page with numbered pink badges."""
+        else:
+            images_hint = """Look at the following image:
+The SCREENSHOT of the current page with numbered pink badges."""
+        
+        prompt = f"""{images_hint}
 
 Task: {step.description}
 {target_hint}{excluded_hint}
@@ -270,8 +505,8 @@ Semantic Intent: {step.semantic_intent or 'Click the correct element'}
 
 ANALYSIS REQUIRED:
 1. Identify the element that matches the Task and Semantic Intent.
-{ "2. Look at the REFERENCE FRAME. Find the MOUSE CURSOR. The target is what the mouse is clicking." if step.visual_context else "" }
-3. Find the matching element in the CURRENT SCREENSHOT.
+{ "2. Look at the REFERENCE FRAME (left). Find the MOUSE CURSOR. The target is what the mouse is clicking." if step.visual_context else "" }
+3. Find the matching element in the CURRENT SCREENSHOT (with the badges).
 4. Verify if the element is covered by a pink badge.
 
 IMPORTANT PRIORITIES:
@@ -281,56 +516,102 @@ IMPORTANT PRIORITIES:
 - Select the badge that covers the TEXT of the link, not the whitespace or icons around it.
 - If description says "+" or "plus", look for a "+" symbol. Do NOT click a "bell" or "notification" icon.
 
-Use the following JSON format for your response:
-{{
-  "reasoning": "Explain why you selected this badge. Mention if it matches the element under the mouse in the reference frame.",
-  "badge_number": "42" (or "NOT_FOUND")
-}}"""
+Respond with:
+- badge_number: the badge to click, e.g. "42" (or "NOT_FOUND")
+- reasoning: why you selected this badge. Mention if it matches the element under the mouse in the reference frame."""
         
+        # Reference frame and screenshot travel as one image, not two parts
+        image = screenshot_jpeg
+        if step.visual_context:
+            image = await asyncio.to_thread(compose_side_by_side, step.visual_context, screenshot_jpeg)
+        
+        # Identical requests (same page image, same prompt incl. exclusions)
+        # get the same pick without another round trip
+        key = hashlib.blake2b(digest_size=16)
+        for part in (model.encode(), image, prompt.encode()):
+            key.update(part)
+        key = key.digest()
+        if key in self._badge_picks:
+            self._badge_picks.move_to_end(key)
+            await self.callback.on_log("Same request as before, reusing badge pick")
+            return self._badge_picks[key]
+        
+        badge_val = await self._request_badge(model, image, prompt)
+        # NOT_FOUND leads to recovery, which may wait and ask again on purpose
+        if str(badge_val).upper() != "NOT_FOUND":
+            self._badge_picks[key] = badge_val
+            if len(self._badge_picks) > BADGE_PICK_CACHE_SIZE:
+                self._badge_picks.popitem(last=False)
+        return badge_val
+    
+    async def _request_badge(self, model: str, image: bytes, prompt: str) -> str:
+        """Send a badge lookup to Gemini. Returns the badge number or "NOT_FOUND"."""
         contents = [
             types.Part.from_bytes(
-                data=base64.b64decode(screenshot_b64),
-                mime_type="image/png"
+                data=image,
+                mime_type="image/jpeg"
             ),
             prompt
         ]
-        
-        # Add visual context if available
-        if step.visual_context:
-            contents.insert(1, types.Part.from_bytes(
-                data=base64.b64decode(step.visual_context),
-                mime_type="image/jpeg"
-            ))
 
-        response = self.client.models.generate_content(
-            model="gemini-pro-latest",
-            contents=contents,
-             config=types.GenerateContentConfig(response_mime_type="application/json")
-        )
-        
-        response_text = response.text.strip()
+        # Stream the answer and stop waiting as soon as badge_number is in;
+        # the reasoning that follows is only logged
+        chunks = []
+        badge_val = None
+        async with self.gemini_sem:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=SOM_CHOICE_CONFIG
+            )
+            async for chunk in stream:
+                chunks.append(chunk.text or "")
+                match = BADGE_NUMBER_PATTERN.search("".join(chunks))
+                if match:
+                    badge_val = match.group(1)
+                    break
+        
+        if badge_val is not None:
+            self._run_in_background(self._log_badge_reasoning(stream, chunks))
+            return badge_val
+        
+        response_text = "".join(chunks).strip()
         await self.callback.on_log(f"Gemini response: {response_text}")
         
         try:
-            import json
-            response_data = json.loads(response_text)
-            badge_val = response_data.get("badge_number", "NOT_FOUND")
-            reasoning = response_data.get("reasoning", "")
-            await self.callback.on_log(f"Gemini reasoning: {reasoning}")
-        except json.JSONDecodeError:
-             # Fallback if model fails JSON (unlikely with config)
-             badge_val = "NOT_FOUND"
-             if "NOT_FOUND" not in response_text:
-                 import re
-                 nums = re.findall(r'\d+', response_text)
-                 if nums: badge_val = nums[0]
-
+            choice = SomClickChoice.model_validate_json(response_text)
+        except ValidationError:
+            return "NOT_FOUND"
+        await self.callback.on_log(f"Gemini reasoning: {choice.reasoning}")
+        return choice.badge_number
+    
+    async def _log_badge_reasoning(self, stream, chunks: list[str]) -> None:
+        """Finish reading a badge answer in the background and log it."""
+        async for chunk in stream:
+            chunks.append(chunk.text or "")
+        
+        response_text = "".join(chunks).strip()
+        await self.callback.on_log(f"Gemini response: {response_text}")
+        try:
+            choice = SomClickChoice.model_validate_json(response_text)
+            await self.callback.on_log(f"Gemini reasoning: {choice.reasoning}")
+        except ValidationError:
+            pass
+    
+    async def _click_badge(
+        self,
+        step: ActionStep,
+        badges: list,
+        screenshot_jpeg: bytes,
+        badge_val: str
+    ) -> None:
+        """Click the badge Gemini picked, verifying and retrying navigation clicks."""
         # Handle NOT_FOUND case with adaptive recovery
         if str(badge_val).upper() == "NOT_FOUND":
             await self.callback.on_log("Element not found - trying adaptive recovery...", "warning")
             
             # Ask Gemini to analyze the page and suggest what to do
-            recovery_action = await self._adaptive_recover(step, screenshot_b64)
+            recovery_action = await self._adaptive_recover(step, screenshot_jpeg)
             
             if recovery_action:
                 return  # Recovery handled the step
@@ -345,6 +626,8 @@ Use the following JSON format for your response:
         if not badge:
             raise ValueError(f"Badge {badge_num} not found in available badges (1-{len(badges)})")
         
+        start_url = self.page.url
+        
         # Click using coordinates (more reliable than selectors)
         # Try clicking via selector first (more robust)
         try:
@@ -359,20 +642,17 @@ Use the following JSON format for your response:
             await self.page.mouse.click(x, y)
             await self.callback.on_log(f"Clicked at ({x:.0f}, {y:.0f}) - badge {badge_num}")
         
-        step.cached_selector = badge["selector"]
+        self._cached_selectors[step.id] = badge["selector"]
         
         # Wait for potential navigation or UI update (dropdowns, modals, etc)
-        await asyncio.sleep(2)
+        await self.page.wait_for_timeout(UI_SETTLE_MS)
+        await self._settle("networkidle", NETWORK_IDLE_TIMEOUT_MS)
         
         # --- CLICK VERIFICATION ---
         # If step.value contains a URL hint, verify we navigated correctly
-        expected_url_hint = step.value or ""
-        if expected_url_hint.startswith("http") or ".com" in expected_url_hint or ".org" in expected_url_hint:
+        expected_domain = step.expected_domain
+        if expected_domain:
             current_url = self.page.url
-            # Extract domain from expected (e.g., "https://github.com" -> "github.com")
-            import re
-            domain_match = re.search(r'(?:https?://)?([^/]+)', expected_url_hint)
-            expected_domain = domain_match.group(1) if domain_match else expected_url_hint
             
             if expected_domain.lower() not in current_url.lower():
                 await self.callback.on_log(f"Verification FAILED: Expected '{expected_domain}' but got '{current_url}'", "warning")
@@ -387,10 +667,26 @@ Use the following JSON format for your response:
                 # Check retry limit
                 if len(self._excluded_badges[step.id]) < 3:
                     await self.callback.on_log(f"Going back to retry (attempt {len(self._excluded_badges[step.id])})", "warning")
-                    await self.page.go_back()
-                    await asyncio.sleep(2)
-                    # Recursive retry with excluded badges
-                    return await self._click_with_som(step)
+                    # Pick the next badge from the capture we already have
+                    # while the page goes back
+                    retry_pick = asyncio.create_task(self._ask_gemini_for_badge(step, screenshot_jpeg))
+                    try:
+                        if self.page.url != start_url:
+                            await self.page.go_back()
+                        
+                        # Same page state as before the click: the cached capture comes back
+                        new_badges, new_screenshot_jpeg = await self._capture_som(step)
+                    except BaseException:
+                        await self._discard_task(retry_pick)
+                        raise
+                    if new_screenshot_jpeg is screenshot_jpeg:
+                        return await self._click_badge(step, badges, screenshot_jpeg, await retry_pick)
+                    
+                    # The page changed; ask again about what is on screen now
+                    await self._discard_task(retry_pick)
+                    await self.callback.on_log("Page changed since the first attempt, re-capturing", "warning")
+                    badge_val = await self._ask_gemini_for_badge(step, new_screenshot_jpeg)
+                    return await self._click_badge(step, new_badges, new_screenshot_jpeg, badge_val)
                 else:
                     await self.callback.on_log("Max retries reached, proceeding anyway", "warning")
             else:
@@ -399,9 +695,16 @@ Use the following JSON format for your response:
                 if hasattr(self, '_excluded_badges') and step.id in self._excluded_badges:
                     del self._excluded_badges[step.id]
         
-        await asyncio.sleep(1)  # Additional settle time
+        await self._settle()
+    
+    async def _settle(self, state: str = "domcontentloaded", timeout: float = SETTLE_TIMEOUT_MS) -> None:
+        """Wait for the page to reach a load state, giving up after timeout ms."""
+        try:
+            await self.page.wait_for_load_state(state, timeout=timeout)
+        except PlaywrightTimeoutError:
+            pass  # Still loading; carry on with what is rendered
     
-    async def _adaptive_recover(self, step: ActionStep, screenshot_b64: str) -> bool:
+    async def _adaptive_recover(self, step: ActionStep, screenshot_jpeg: bytes) -> bool:
         """
         When an expected element isn't found, analyze the page and try to recover.
         
@@ -422,26 +725,31 @@ Look at the current page screenshot. What's happening? Choose ONE action:
 
 Consider the alternatives listed above - they may hint at what else could work.
 
-Respond in this format:
-ACTION: [WAIT/CLICK_ALTERNATIVE/SKIP/FAIL]
-REASON: [Brief explanation]
-TARGET: [Only for CLICK_ALTERNATIVE - describe what to click]"""
-
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[
-                types.Part.from_bytes(
-                    data=base64.b64decode(screenshot_b64),
-                    mime_type="image/png"
-                ),
-                prompt
-            ]
-        )
+Respond with:
+- action: WAIT, CLICK_ALTERNATIVE, SKIP or FAIL
+- reason: brief explanation
+- target: only for CLICK_ALTERNATIVE - describe what to click"""
+
+        async with self.gemini_sem:
+            response = await self.client.aio.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=[
+                    types.Part.from_bytes(
+                        data=screenshot_jpeg,
+                        mime_type="image/jpeg"
+                    ),
+                    prompt
+                ],
+                config=RECOVERY_CONFIG
+            )
         
-        response_text = response.text.strip()
-        await self.callback.on_log(f"Recovery analysis: {response_text}")
+        try:
+            decision = RecoveryDecision.model_validate_json(response.text)
+        except (ValidationError, TypeError):
+            return False
+        await self.callback.on_log(f"Recovery analysis: {decision.action} - {decision.reason}")
         
-        if "ACTION: WAIT" in response_text:
+        if decision.action == "WAIT":
             await self.callback.on_log("Waiting for page to update...", "info")
             await asyncio.sleep(3)
             
@@ -452,37 +760,39 @@ TARGET: [Only for CLICK_ALTERNATIVE - describe what to click]"""
             except Exception:
                 return False
         
-        elif "ACTION: CLICK_ALTERNATIVE" in response_text:
+        elif decision.action == "CLICK_ALTERNATIVE":
             await self.callback.on_log("Looking for alternative element...", "info")
             
-            # Re-inject SoM and ask for the alternative
-            await self.page.evaluate(SOM_SCRIPT_LOADER)
-            badges = await self.page.evaluate("window.DooleySOM.inject()")
-            screenshot_bytes = await self.page.screenshot()
-            new_screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
-            await self.page.evaluate("window.DooleySOM.cleanup()")
+            # Re-inject SoM (or reuse the capture if nothing changed) and ask for the alternative
+            try:
+                badges, new_screenshot_jpeg = await self._capture_som(step)
+            except ValueError:
+                return False
             
             # Extract what to click from the response
             alt_prompt = f"""Look at this screenshot with numbered pink badges.
 The user wants to: {step.description}
-Based on the recovery analysis, which badge should I click?
-Respond with ONLY the badge number."""
+Based on the recovery analysis, click: {decision.target or 'the best alternative'}
+Which badge should I click?"""
             
-            alt_response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[
-                    types.Part.from_bytes(
-                        data=base64.b64decode(new_screenshot_b64),
-                        mime_type="image/png"
-                    ),
-                    alt_prompt
-                ]
-            )
+            async with self.gemini_sem:
+                alt_response = await self.client.aio.models.generate_content(
+                    model="gemini-2.0-flash",
+                    contents=[
+                        types.Part.from_bytes(
+                            data=new_screenshot_jpeg,
+                            mime_type="image/jpeg"
+                        ),
+                        alt_prompt
+                    ],
+                    config=ALTERNATIVE_BADGE_CONFIG
+                )
             
-            import re
-            numbers = re.findall(r'\d+', alt_response.text.strip())
-            if numbers:
-                badge_num = int(numbers[0])
+            try:
+                badge_num = BadgeChoice.model_validate_json(alt_response.text).badge
+            except (ValidationError, TypeError):
+                badge_num = None
+            if badge_num is not None:
                 badge = next((b for b in badges if b["id"] == badge_num), None)
                 if badge:
                     rect = badge["rect"]
@@ -493,7 +803,7 @@ Respond with ONLY the badge number."""
                     return True
             return False
         
-        elif "ACTION: SKIP" in response_text:
+        elif decision.action == "SKIP":
             await self.callback.on_log("Skipping step (already completed or unnecessary)", "info")
             return True
         
@@ -563,22 +873,41 @@ Respond with ONLY the badge number."""
         await asyncio.sleep(2)
         await self.callback.on_log("Waited 2 seconds")
     
-    async def _capture_screenshot(self, step_id: int) -> str:
-        """Capture and save screenshot, return base64."""
-        path = self.screenshot_dir / f"step_{step_id}.png"
-        await self.page.screenshot(path=path)
-        
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
+    async def _capture_screenshot(self, step_id: int) -> bytes:
+        """Capture and save screenshot, return the PNG bytes."""
+        data = await self.page.screenshot()
+        self._write_in_background(self.screenshot_dir / f"step_{step_id}.png", data)
+        return data
+    
+    def _write_in_background(self, path: Path, data: bytes) -> None:
+        """Write a file off the event loop without waiting for it."""
+        self._run_in_background(asyncio.to_thread(path.write_bytes, data))
+    
+    @staticmethod
+    async def _discard_task(task: asyncio.Task) -> None:
+        """Cancel a task whose result is no longer wanted and wait for it to unwind."""
+        task.cancel()
+        # wait() doesn't raise the task's CancelledError (or its own exception,
+        # if it finished first), yet still lets a cancel of the caller through
+        await asyncio.wait([task])
+        if not task.cancelled():
+            task.exception()  # Mark a failure as retrieved
+    
+    def _run_in_background(self, coro) -> None:
+        """Schedule coro without waiting for it; stop() waits for stragglers."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
 
 async def execute_plan(
     plan: ExecutionPlan,
     callback: Optional[NavigatorCallback] = None,
-    headless: bool = False
+    headless: bool = False,
+    persist_session: bool = True
 ) -> None:
     """Convenience function to execute a plan."""
-    nav = Navigator(callback=callback, headless=headless)
+    nav = Navigator(callback=callback, headless=headless, persist_session=persist_session)
     
     try:
         await nav.start()
@@ -1,11 +1,25 @@
-from pydantic import BaseModel
+import re
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict, field_serializer, field_validator
 from typing import Literal, Optional, List
+from urllib.parse import urlsplit
+
+try:
+    import pybase64 as base64  # SIMD base64, same API as the stdlib module
+except ImportError:  # stdlib base64 is the fallback
+    import base64
+
+
+# Step values that name a destination (checked after CLICKs)
+URL_HINT_PATTERN = re.compile(r'^http|\.com|\.org')
 
 
 class ActionStep(BaseModel):
     """
     Represents a single action in an execution plan.
     
+    Steps are immutable; derive changed copies with model_copy(update=...).
+    
     Attributes:
         id: Step number
         action_type: Type of action (CLICK, TYPE, etc.)
@@ -15,6 +29,8 @@ class ActionStep(BaseModel):
         semantic_intent: The high-level goal of this step (for fallback recovery)
         alternatives: Alternative ways to achieve this step if primary fails
     """
+    model_config = ConfigDict(frozen=True)
+    
     id: int
     action_type: Literal["CLICK", "TYPE", "WAIT", "SCROLL", "NAVIGATE"]
     description: str 
@@ -27,7 +43,40 @@ class ActionStep(BaseModel):
     
     # Visual grounding
     timestamp: Optional[str] = None  # e.g., "00:15"
-    visual_context: Optional[str] = None  # Base64 encoded crop/frame of what to click
+    visual_context: Optional[bytes] = None  # JPEG crop/frame of what to click (base64 in JSON)
+    
+    @field_validator("visual_context", mode="before")
+    @classmethod
+    def _decode_visual_context(cls, value):
+        # JSON clients send the frame base64 encoded
+        return base64.b64decode(value) if isinstance(value, str) else value
+    
+    @field_serializer("visual_context", when_used="json")
+    def _encode_visual_context(self, value: Optional[bytes]) -> Optional[str]:
+        return base64.b64encode(value).decode("ascii") if value is not None else None
+    
+    # Derived from value on access (not stored: model_copy(update=...) would
+    # carry a stored copy over unchanged); _url_hints caches the work
+    @property
+    def normalized_url(self) -> Optional[str]:
+        """value as an absolute URL (for NAVIGATE)."""
+        return _url_hints(self.value)[0]
+    
+    @property
+    def expected_domain(self) -> Optional[str]:
+        """Domain a CLICK should land on, if value names one (e.g. "github.com")."""
+        return _url_hints(self.value)[1]
+
+
+@lru_cache(maxsize=256)
+def _url_hints(value: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    """(normalized URL, expected domain) for a step value."""
+    if not value:
+        return None, None
+    # Add https if missing
+    url = value if value.startswith("http") else f"https://{value}"
+    domain = (urlsplit(url).netloc or value) if URL_HINT_PATTERN.search(value) else None
+    return url, domain
 
 
 class ExecutionPlan(BaseModel):
@@ -38,5 +87,84 @@ class ExecutionPlan(BaseModel):
         steps: List of ActionStep objects in execution order
         source_url: The starting URL detected in the video (if any)
     """
+    model_config = ConfigDict(frozen=True)
+    
     steps: List[ActionStep]
     source_url: Optional[str] = None  # Detected starting URL from video
+
+
+class PlanBatch(BaseModel):
+    """
+    Plans for several videos analyzed in one Gemini call.
+    
+    Attributes:
+        plans: One ExecutionPlan per video, in the order the videos were sent
+    """
+    plans: List[ExecutionPlan]
+
+
+class AgentDecision(BaseModel):
+    """
+    Next action chosen by the agent, used as Gemini's response schema.
+    
+    Attributes:
+        type: Action to take
+        badge: Badge number to act on (CLICK, TYPE)
+        text: Text to type (TYPE)
+        url: Page to open (NAVIGATE)
+        direction: "up" or "down" (SCROLL)
+        reason: Why the goal cannot be achieved (FAIL)
+    """
+    type: Literal["CLICK", "TYPE", "NAVIGATE", "SCROLL", "WAIT", "DONE", "FAIL"]
+    badge: Optional[int] = None
+    text: Optional[str] = None
+    url: Optional[str] = None
+    direction: Optional[str] = None
+    reason: Optional[str] = None
+
+
+class BadgeChoice(BaseModel):
+    """Badge picked by Gemini for a single element lookup."""
+    badge: int
+
+
+class StepBadgeChoice(BaseModel):
+    """Badge picked by Gemini for one step of a batched lookup."""
+    step: int
+    badge: int
+
+
+class BadgeBatchChoice(BaseModel):
+    """
+    Badges picked by Gemini for several steps in one lookup.
+    
+    Attributes:
+        choices: One badge per step the model could place
+    """
+    choices: List[StepBadgeChoice]
+
+
+class SomClickChoice(BaseModel):
+    """
+    Badge picked by the navigator's vision fallback, used as Gemini's response schema.
+    
+    Attributes:
+        badge_number: Badge to click, or "NOT_FOUND" (comes first so it streams first)
+        reasoning: Why this badge was chosen
+    """
+    badge_number: str
+    reasoning: str
+
+
+class RecoveryDecision(BaseModel):
+    """
+    How to recover when a step's element wasn't found.
+    
+    Attributes:
+        action: WAIT for the page, CLICK_ALTERNATIVE, SKIP the step, or FAIL
+        reason: Brief explanation
+        target: What to click instead (CLICK_ALTERNATIVE)
+    """
+    action: Literal["WAIT", "CLICK_ALTERNATIVE", "SKIP", "FAIL"]
+    reason: str
+    target: Optional[str] = None
@@ -1,4 +1,5 @@
-window.DooleySOM = {
+// Installed once per document; re-running the script keeps the existing instance
+window.DooleySOM = window.DooleySOM || {
     inject: () => {
         // Remove any existing SoM badges
         document.querySelectorAll('.dooley-som-badge').forEach(el => el.remove());
@@ -142,5 +143,21 @@ window.DooleySOM = {
     
     cleanup: () => {
         document.querySelectorAll('.dooley-som-badge').forEach(el => el.remove());
+    },
+    
+    // Cheap page-state key: changes whenever badges or the screenshot would
+    fingerprint: () => [
+        location.href,
+        document.body.children.length,
+        document.body.innerHTML.length,
+        window.scrollX, window.scrollY,
+        window.innerWidth, window.innerHeight
+    ].join('|'),
+    
+    // Fingerprint + inject in one call; badges is null if the state is in known
+    capture: (known) => {
+        const fingerprint = window.DooleySOM.fingerprint();
+        if (known.includes(fingerprint)) return { fingerprint, badges: null };
+        return { fingerprint, badges: window.DooleySOM.inject() };
     }
 }
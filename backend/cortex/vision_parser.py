@@ -5,15 +5,40 @@ This module processes uploaded videos and uses Gemini's multimodal
 capabilities to understand user actions and generate a structured
 execution plan.
 """
+import asyncio
+import hashlib
 import json
+import mmap
+import os
+import queue
+import random
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterable, Iterator
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 import cv2
-import base64
+import numpy as np
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError
 
-from cortex.schemas import ActionStep, ExecutionPlan
+try:
+    import orjson
+except ImportError:  # stdlib json is the fallback
+    orjson = None
+
+try:
+    from turbojpeg import TurboJPEG
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # no libturbojpeg; cv2.imencode is the fallback
+    _turbo_jpeg = None
+
+from cortex.schemas import ActionStep, ExecutionPlan, PlanBatch
 from config import get_settings
 
 
@@ -21,6 +46,35 @@ from config import get_settings
 settings = get_settings()
 client = genai.Client(api_key=settings.gemini_api_key)
 
+# Model that turns a recording into a plan
+PLAN_MODEL = "gemini-2.0-flash"
+
+PLAN_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json"
+)
+
+# Frame extraction decodes through gaps up to this long instead of seeking
+SEEK_AHEAD_SECONDS = 10
+
+# Reference frames wider than this are downscaled before encoding
+FRAME_MAX_WIDTH = 1280  # 800 was too small for small icons
+
+# Maps video content digests to files already uploaded to Gemini
+UPLOAD_CACHE_PATH = settings.temp_path / ".gemini_cache.json"
+
+# Serializes read-modify-write of the cache file (taken in worker threads)
+_upload_cache_lock = threading.Lock()
+
+# Warning/error lines from yt-dlp kept for the failure message
+YTDLP_LOG_TAIL = 200
+
+# Cached uploads this close to expiring (seconds) are uploaded again
+UPLOAD_EXPIRY_MARGIN = 3600
+
+# Polling for upload processing backs off from the first delay to the cap (seconds)
+PROCESSING_POLL_INITIAL = 0.5
+PROCESSING_POLL_MAX = 5.0
+
 # System prompt for video analysis
 VISION_PROMPT = """You are Dooley, a visual autonomous browser agent. 
 Analyze this video recording of a user performing a browser task.
@@ -109,13 +163,30 @@ Include every user action you observe in chronological order.
 REMEMBER: First step MUST be NAVIGATE! Include semantic_intent for EVERY step!
 """
 
+# Appended to VISION_PROMPT when several videos share one request
+BATCH_PROMPT = """
+## MULTIPLE VIDEOS
+You were given {count} separate videos, labelled "Video 1" to "Video {count}".
+Analyze each one independently and return ONLY valid JSON in this format:
+{{"plans": [<plan for Video 1>, <plan for Video 2>, ...]}}
+where every plan has exactly the single-video format above.
+Return exactly {count} plans, in the same order as the videos.
+"""
+
 
-async def parse_video(video_path: str | Path) -> ExecutionPlan:
+async def parse_video(
+    video_path: str | Path,
+    mime_type: str | None = None,
+    digest: str | None = None
+) -> ExecutionPlan:
     """
     Analyze a video file and extract an execution plan.
     
     Args:
         video_path: Path to the video file (MP4, WebM, etc.)
+        mime_type: Video MIME type, for paths whose extension doesn't say
+        digest: The file's video_hasher() hex digest, if the caller already
+            computed it while writing the file
         
     Returns:
         ExecutionPlan with extracted steps
@@ -125,92 +196,451 @@ async def parse_video(video_path: str | Path) -> ExecutionPlan:
     if not video_path.exists():
         raise FileNotFoundError(f"Video not found: {video_path}")
     
-    # Upload video to Gemini
-    video_file = client.files.upload(file=str(video_path))
+    # Upload video to Gemini (or reuse an earlier upload of the same content)
+    video_file = await _upload_video(video_path, mime_type, digest)
     
-    # Wait for processing
-    while video_file.state.name == "PROCESSING":
-        time.sleep(2)
-        video_file = client.files.get(name=video_file.name)
+    if settings.batch_video_analysis:
+        # Batched calls answer several videos at once, so the plan can't be
+        # streamed per video; frames are grabbed once it is in
+        steps = (await _plan_batcher.submit(video_file)).steps
+        frames = None
+    else:
+        # Frames are grabbed while the plan is still being generated: each step's
+        # timestamp goes to the extractor thread as soon as its object is complete
+        timestamps: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        frames_task = asyncio.create_task(
+            asyncio.to_thread(_grab_frames, video_path, iter(timestamps.get, None))
+        )
+        try:
+            result_text = await _stream_plan_text(video_file, timestamps)
+        except BaseException as e:
+            # The stream's error is the one to raise: don't wait for frames
+            # nobody will use, or let an extraction error replace it
+            frames_task.cancel()
+            print(f"Abandoning frame extraction, plan streaming failed: {e!r}")
+            raise
+        finally:
+            # Ends the extractor's timestamp iterator either way
+            timestamps.put(None)
+        frames = await frames_task
+        steps = _parse_plan(result_text, ExecutionPlan).steps
     
-    if video_file.state.name == "FAILED":
-        raise RuntimeError(f"Video processing failed: {video_file.state.name}")
+    # Post-process to clean up redundant steps
+    steps = _post_process_steps(steps)
     
-    # Generate content
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[video_file, VISION_PROMPT],
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json"
+    if frames is None:
+        frames = await asyncio.to_thread(
+            _grab_frames, video_path, [step.timestamp for step in steps if step.timestamp]
         )
+    
+    # Attach the extracted frames for context
+    steps = [
+        step.model_copy(update={"visual_context": frames[step.timestamp]})
+        if step.timestamp in frames else step
+        for step in steps
+    ]
+    
+    return ExecutionPlan(steps=steps)
+
+
+def _parse_plan(result_text: str, model: type[ExecutionPlan] | type[PlanBatch]):
+    """Validate Gemini's JSON answer as model, tolerating a markdown fence around it."""
+    # Slices by index rather than splitting into lines; surrounding
+    # whitespace is left to the JSON parser.
+    fence = result_text.find("```")
+    if fence != -1 and not result_text[:fence].strip():
+        first = result_text.find("\n", fence) + 1
+        last = result_text.rfind("\n```")
+        result_text = result_text[first:last] if last > first else result_text[first:]
+    
+    # Parse and validate in one pass (pydantic-core reads the JSON itself,
+    # no intermediate dicts)
+    return model.model_validate_json(result_text)
+
+
+class _PlanBatcher:
+    """
+    Micro-batches plan requests into shared Gemini calls.
+    
+    Requests arriving within a short window (up to a maximum batch size)
+    are sent as one multi-video generate_content call, saving a round trip
+    per extra video. Each caller awaits a future for its own plan. The
+    collector task starts on first use, on the running event loop.
+    """
+    
+    def __init__(self, max_size: int, window_ms: int):
+        self.max_size = max_size
+        self.window = window_ms / 1000
+        self._queue: asyncio.Queue[tuple[types.File, asyncio.Future]] | None = None
+        self._collector: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+    
+    async def submit(self, video_file: types.File) -> ExecutionPlan:
+        """Queue an uploaded video and wait for its plan."""
+        loop = asyncio.get_running_loop()
+        if self._collector is None or self._collector.done() or self._collector.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect())
+        
+        future = loop.create_future()
+        self._queue.put_nowait((video_file, future))
+        return await future
+    
+    async def _collect(self) -> None:
+        """Gather requests into batches and answer each batch in its own task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            task = loop.create_task(self._answer(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+    
+    async def _answer(self, batch: list[tuple[types.File, asyncio.Future]]) -> None:
+        """Generate the plans for a batch and resolve its futures."""
+        try:
+            plans = await _generate_plans([video_file for video_file, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), plan in zip(batch, plans):
+            if not future.done():  # The caller may have gone away
+                future.set_result(plan)
+
+
+async def _generate_plans(video_files: list[types.File]) -> list[ExecutionPlan]:
+    """Generate plans for several uploaded videos with a single Gemini call."""
+    if len(video_files) == 1:
+        contents = [video_files[0], VISION_PROMPT]
+    else:
+        contents = []
+        for i, video_file in enumerate(video_files, 1):
+            contents += [f"Video {i}:", video_file]
+        contents += [VISION_PROMPT, BATCH_PROMPT.format(count=len(video_files))]
+    
+    response = await client.aio.models.generate_content(
+        model=PLAN_MODEL,
+        contents=contents,
+        config=PLAN_CONFIG
     )
+    
+    if len(video_files) == 1:
+        return [_parse_plan(response.text, ExecutionPlan)]
+    
+    plans = _parse_plan(response.text, PlanBatch).plans
+    if len(plans) != len(video_files):
+        raise RuntimeError(f"Expected {len(video_files)} plans from a batched call, got {len(plans)}")
+    return plans
+
+
+_plan_batcher = _PlanBatcher(settings.analysis_batch_size, settings.analysis_batch_window_ms)
+
 
+async def _upload_video(
+    video_path: Path,
+    mime_type: str | None,
+    digest: str | None
+) -> types.File:
+    """
+    Upload a video to Gemini and wait until it is processed.
     
-    # Parse response
-    result_text = response.text.strip()
+    Uploads are cached by content digest, so re-analyzing the same video
+    reuses the file Gemini already holds and skips the upload and the
+    server-side processing. The SDK reads the file for upload through
+    anyio, so that part never blocks the event loop either.
+    """
+    if digest is None:
+        digest = await asyncio.to_thread(_digest, video_path)
+    cache = await asyncio.to_thread(_read_upload_cache)
     
-    # Handle potential markdown code blocks
-    if result_text.startswith("```"):
-        lines = result_text.split("\n")
-        result_text = "\n".join(lines[1:-1])
+    video_file = None
+    cached = cache.get(digest)
+    if cached and cached["expires"] > time.time() + UPLOAD_EXPIRY_MARGIN:
+        try:
+            video_file = await client.aio.files.get(name=cached["name"])
+        except errors.APIError:
+            video_file = None  # Deleted or expired early; upload again
+        if video_file is not None and video_file.state.name == "FAILED":
+            video_file = None
     
-    data = json.loads(result_text)
+    if video_file is None:
+        upload_config = {"mime_type": mime_type} if mime_type else None
+        video_file = await client.aio.files.upload(file=str(video_path), config=upload_config)
     
-    # Validate and create ExecutionPlan
-    steps = [ActionStep(**step) for step in data["steps"]]
+    # Wait for processing: short videos are ready quickly, long ones
+    # don't need polling every couple of seconds
+    delay = PROCESSING_POLL_INITIAL
+    while video_file.state.name == "PROCESSING":
+        # Jitter keeps concurrent uploads from polling in lockstep
+        await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, PROCESSING_POLL_MAX)
+        video_file = await client.aio.files.get(name=video_file.name)
     
-    # Post-process to clean up redundant steps
-    steps = _post_process_steps(steps)
+    if video_file.state.name == "FAILED":
+        raise RuntimeError(f"Video processing failed: {video_file.state.name}")
     
-    # Extract frames for context
-    steps = _extract_frames(video_path, steps)
+    if video_file.expiration_time is not None and (not cached or cached["name"] != video_file.name):
+        await asyncio.to_thread(_record_upload, digest, {
+            "name": video_file.name,
+            "expires": video_file.expiration_time.timestamp()
+        })
     
-    return ExecutionPlan(steps=steps)
+    return video_file
+
+
+def video_hasher() -> "hashlib._Hash":
+    """Return a fresh hasher for the digests the upload cache is keyed by."""
+    return hashlib.blake2b(digest_size=16)
+
 
+def _digest(path: Path) -> str:
+    """Hash a file's contents (memory-mapped, so it is never copied into Python)."""
+    hasher = video_hasher()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hasher.update(data)
+    return hasher.hexdigest()
 
-def _extract_frames(video_path: Path, steps: list[ActionStep]) -> list[ActionStep]:
-    """Extract frames from video for each step based on timestamp."""
-    cap = cv2.VideoCapture(str(video_path))
+
+def _read_upload_cache() -> dict:
+    """Load the upload cache, dropping entries that have expired."""
+    try:
+        cache = json.loads(UPLOAD_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    now = time.time()
+    return {digest: entry for digest, entry in cache.items() if entry.get("expires", 0) > now}
+
+
+def _record_upload(digest: str, entry: dict) -> None:
+    """
+    Add an entry to the upload cache.
     
-    if not cap.isOpened():
-        print(f"Warning: Could not open video for frame extraction: {video_path}")
-        return steps
+    The file is re-read and rewritten under a lock, so concurrent analyses
+    don't drop each other's entries, and replaced atomically, so a crash
+    mid-write can't leave it truncated.
+    """
+    with _upload_cache_lock:
+        cache = _read_upload_cache()
+        cache[digest] = entry
+        fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_CACHE_PATH.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, UPLOAD_CACHE_PATH)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+async def _stream_plan_text(video_file: types.File, timestamps: queue.SimpleQueue) -> str:
+    """
+    Generate the plan for an uploaded video, returning the raw response text.
+    
+    Every step timestamp is put on the queue as soon as the step's JSON
+    object has been streamed in full.
+    """
+    stream = await client.aio.models.generate_content_stream(
+        model=PLAN_MODEL,
+        contents=[video_file, VISION_PROMPT],
+        config=PLAN_CONFIG
+    )
+    
+    chunks = []
+    scanner = _StepScanner()
+    async for chunk in stream:
+        text = chunk.text or ""
+        chunks.append(text)
+        for step in scanner.feed(text):
+            timestamp = step.get("timestamp")
+            if isinstance(timestamp, str) and timestamp:
+                timestamps.put(timestamp)
+    
+    return "".join(chunks)
+
+
+def _json_loads(text: str):
+    """Parse JSON text with orjson when available."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+class _StepScanner:
+    """
+    Incremental scanner that picks complete step objects out of streamed JSON.
+    
+    Tracks brace depth (skipping over string contents) from the opening '['
+    of the "steps" array, and parses each top-level object in it once its
+    closing brace arrives. Malformed objects are skipped; the full response
+    is parsed again at the end anyway.
+    """
+    
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._obj_start = -1
+    
+    def feed(self, text: str) -> list[dict]:
+        """Add streamed text and return the step objects it completed."""
+        self._text += text
+        if not self._in_array:
+            key = self._text.find('"steps"')
+            bracket = self._text.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return []
+            self._in_array = True
+            self._pos = bracket + 1
         
-    fps = cap.get(cv2.CAP_PROP_FPS)
+        completed = []
+        text = self._text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._obj_start = pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(_json_loads(text[self._obj_start:pos + 1]))
+                    except ValueError:
+                        pass
+        self._pos = len(text)
+        return completed
+
+
+def _grab_frames(video_path: Path, timestamps: Iterable[str]) -> dict[str, bytes]:
+    """
+    Grab and JPEG-encode the video frame at each timestamp, keyed by timestamp.
     
-    for step in steps:
-        if not step.timestamp:
-            continue
-            
-        try:
-            # Parse timestamp MM:SS
-            parts = step.timestamp.split(':')
-            if len(parts) == 2:
-                seconds = int(parts[0]) * 60 + int(parts[1])
-            else:
-                seconds = int(float(step.timestamp))
-                
-            # Seek to frame
-            frame_num = int(seconds * fps)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-            
-            ret, frame = cap.read()
-            if ret:
-                # Resize to reduce size (max 1280px width) - 800 was too small for small icons
-                height, width = frame.shape[:2]
-                if width > 1280:
-                    scale = 1280 / width
-                    frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
+    Timestamps are consumed as they arrive, so this can run while the plan
+    is still streaming in. The video is decoded forward, grabbing frames as
+    the play-head passes each timestamp; random seeks would make the decoder
+    rewind to a keyframe and decode forward again for every step. Long gaps
+    and out-of-order timestamps are handled with a seek. Resizing and JPEG
+    encoding run in a thread pool while decoding continues (OpenCV releases
+    the GIL).
+    """
+    with _open_video(video_path) as cap:
+        if not cap.isOpened():
+            print(f"Warning: Could not open video for frame extraction: {video_path}")
+            for _ in timestamps:
+                pass  # Drain the producer
+            return {}
+        
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        
+        encoded = {}
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            current = -1  # Index of the frame last grabbed
+            target_size = None  # (width, height) reference frames are encoded at
+            for timestamp in timestamps:
+                if timestamp in encoded:
+                    continue
+                try:
+                    frame_num = int(_timestamp_seconds(timestamp) * fps)
+                except ValueError as e:
+                    print(f"Error extracting frame at {timestamp}: {e}")
+                    continue
                 
-                # Encode to base64
-                _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-                step.visual_context = base64.b64encode(buffer).decode('utf-8')
+                if frame_num < current or frame_num - current > SEEK_AHEAD_SECONDS * fps:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+                    current = frame_num - 1
+                while current < frame_num and cap.grab():
+                    current += 1
+                if current < frame_num:
+                    continue  # Past the end of the video
                 
+                ret, frame = cap.retrieve()
+                if ret:
+                    if target_size is None:
+                        # Every frame of a video shares its resolution, size it once
+                        height, width = frame.shape[:2]
+                        scale = min(1.0, FRAME_MAX_WIDTH / width)
+                        target_size = (int(width * scale), int(height * scale))
+                    encoded[timestamp] = pool.submit(_encode_frame, frame, target_size)
+    
+    frames = {}
+    for timestamp, future in encoded.items():
+        try:
+            frames[timestamp] = future.result()
         except Exception as e:
-            print(f"Error extracting frame for step {step.id}: {e}")
-            
-    cap.release()
-    return steps
+            print(f"Error extracting frame at {timestamp}: {e}")
+    return frames
+
+
+@contextmanager
+def _open_video(video_path: Path) -> Iterator[cv2.VideoCapture]:
+    """
+    Open a video with the FFmpeg backend, releasing it however the block exits.
+    
+    Naming the backend skips OpenCV probing the others (GStreamer etc.) first.
+    """
+    cap = cv2.VideoCapture(str(video_path), cv2.CAP_FFMPEG)
+    try:
+        yield cap
+    finally:
+        cap.release()
+
+
+def _timestamp_seconds(timestamp: str) -> int:
+    """Parse a MM:SS (or plain seconds) timestamp."""
+    # Fast path for the documented MM:SS form, without split or int()
+    if len(timestamp) == 5 and timestamp[2] == ":":
+        m1, m0, _, s1, s0 = timestamp
+        if "0" <= m1 <= "9" and "0" <= m0 <= "9" and "0" <= s1 <= "9" and "0" <= s0 <= "9":
+            return (ord(m1) - 48) * 600 + (ord(m0) - 48) * 60 + (ord(s1) - 48) * 10 + (ord(s0) - 48)
+    
+    parts = timestamp.split(':')
+    if len(parts) == 2:
+        return int(parts[0]) * 60 + int(parts[1])
+    return int(float(timestamp))
+
+
+# Per-thread downscale target, reused across frames
+_resize_buffers = threading.local()
+
+
+def _encode_frame(frame: np.ndarray, size: tuple[int, int]) -> bytes:
+    """Shrink a decoded frame to size (width, height) for use as a reference image and JPEG it."""
+    width, height = size
+    if frame.shape[1] != width:
+        # Encoder threads each resize into their own reusable buffer
+        dst = getattr(_resize_buffers, "frame", None)
+        if dst is None or dst.shape != (height, width, frame.shape[2]):
+            dst = _resize_buffers.frame = np.empty((height, width, frame.shape[2]), dtype=frame.dtype)
+        frame = cv2.resize(frame, size, dst=dst, interpolation=cv2.INTER_AREA)
+    
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(frame, quality=80)
+    _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    return buffer.tobytes()
 
 
 def _post_process_steps(steps: list[ActionStep]) -> list[ActionStep]:
@@ -231,8 +661,10 @@ def _post_process_steps(steps: list[ActionStep]) -> list[ActionStep]:
         
         # Merge consecutive TYPE actions if they seem to be the same input
         if (step.action_type == "TYPE" and prev.action_type == "TYPE"):
-            # If values overlap or descriptions are similar
-            vals_overlap = prev.value and step.value and (prev.value in step.value or step.value in prev.value)
+            # If one value extends the other (typing grows the text as a prefix)
+            vals_overlap = bool(prev.value) and bool(step.value) and (
+                step.value.startswith(prev.value) or prev.value.startswith(step.value)
+            )
             
             if vals_overlap:
                 # Keep the new one as it's likely the more complete version
@@ -242,60 +674,88 @@ def _post_process_steps(steps: list[ActionStep]) -> list[ActionStep]:
         merged.append(step)
     
     # Re-number IDs
-    for i, s in enumerate(merged, 1):
-        s.id = i
-        
-    return merged
+    return [s.model_copy(update={"id": i}) for i, s in enumerate(merged, 1)]
 
 
-async def parse_video_from_url(video_url: str, output_dir: str | Path) -> ExecutionPlan:
+class _YtDlpLogTail:
+    """
+    yt-dlp logger that keeps only the last few warnings and errors.
+    
+    Informational output is dropped as it arrives instead of accumulating;
+    the retained tail is all a failed download needs to explain itself.
+    """
+    
+    def __init__(self, maxlen: int = YTDLP_LOG_TAIL):
+        self.lines: deque[str] = deque(maxlen=maxlen)
+    
+    def debug(self, msg: str) -> None:
+        pass
+    
+    def warning(self, msg: str) -> None:
+        self.lines.append(f"WARNING: {msg}")
+    
+    def error(self, msg: str) -> None:
+        self.lines.append(msg)
+
+
+def _download_video(video_url: str, ydl_opts: dict) -> Path:
+    """Download a single video with yt-dlp (blocking) and return where it landed."""
+    with YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(video_url, download=True)
+    return Path(info["requested_downloads"][0]["filepath"])
+
+
+async def parse_video_from_url(
+    video_url: str,
+    output_dir: str | Path,
+    download_concurrency: int = 4
+) -> ExecutionPlan:
     """
     Download a video from URL and parse it.
     
     Args:
         video_url: URL of the video (YouTube, direct link, etc.)
         output_dir: Directory to save downloaded video
+        download_concurrency: Fragments yt-dlp downloads in parallel
         
     Returns:
         ExecutionPlan with extracted steps
     """
-    import sys
-    import subprocess
-    
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     
     # Clean up any existing downloaded files
     for old_file in output_dir.glob("downloaded_video*"):
-        old_file.unlink()
+        old_file.unlink(missing_ok=True)
     
     output_template = str(output_dir / "downloaded_video.%(ext)s")
     
-    # Use Python to run yt-dlp module (works cross-platform)
-    # Use 'best' format that is already mp4, or best available and recode
-    # Use Python to run yt-dlp module (works cross-platform)
-    # Get best video-only or single file (audio not needed for vision)
-    cmd = [
-        sys.executable,  # Current Python interpreter
-        "-m", "yt_dlp",
-        "-f", "bestvideo",
-        "-o", output_template,
-        "--no-playlist",
-        video_url
-    ]
+    log_tail = _YtDlpLogTail()
     
-    print(f"📥 Downloading video...")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Get best video-only or single file (audio not needed for vision).
+    # Parallel fragments and ranged chunks get around YouTube's per-connection throttle.
+    ydl_opts = {
+        "format": "bestvideo",
+        "outtmpl": output_template,
+        "noplaylist": True,
+        "concurrent_fragment_downloads": download_concurrency,
+        "http_chunk_size": 10 * 1024 * 1024,
+        "noprogress": True,
+        "logger": log_tail,
+    }
     
-    if result.returncode != 0:
-        raise RuntimeError(f"Failed to download video: {result.stderr}")
+    print(f"📥 Downloading video...")
+    # yt-dlp runs in-process; its blocking download goes to a worker thread
+    try:
+        output_path = await asyncio.to_thread(_download_video, video_url, ydl_opts)
+    except DownloadError as e:
+        details = "\n".join(log_tail.lines) or str(e)
+        raise RuntimeError(f"Failed to download video: {details}") from e
     
-    # Find the downloaded file
-    downloaded_files = list(output_dir.glob("downloaded_video.*"))
-    if not downloaded_files:
+    # yt-dlp reports the final path, no need to look for the file
+    if not output_path.exists():
         raise FileNotFoundError(f"No downloaded file found in {output_dir}")
     
-    output_path = downloaded_files[0]
     print(f"✅ Downloaded to: {output_path}")
     
     return await parse_video(output_path)
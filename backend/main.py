@@ -3,18 +3,30 @@ Dooley Backend - FastAPI Application Entry Point
 
 Run with: uvicorn main:app --reload
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from api.routes import router as api_router
 from config import get_settings
+from cortex.agent import shutdown_agents
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release browsers kept warm between requests when the server stops."""
+    yield
+    await shutdown_agents()
+
+
 app = FastAPI(
     title="Dooley Cortex",
     description="Visual Autonomous Browser Agent - Backend API",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware for frontend
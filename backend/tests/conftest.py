@@ -0,0 +1,14 @@
+"""
+Shared pytest setup.
+
+Settings require a Gemini key at import time; unit tests never reach the
+API, so any value will do.
+"""
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+# Import backend modules the same way the app does
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,91 @@
+"""
+Tests for the agent's pure prompt and capture helpers.
+"""
+import pytest
+
+from cortex.agent import PROMPT_BADGE_LIMIT, SCREENSHOT_MAX_SIDE, AgenticExecutor, screenshot_clip
+
+
+def _badges(*specs: tuple[str, str]) -> dict[int, dict]:
+    return {i: {"id": i, "label": label, "region": region} for i, (label, region) in enumerate(specs, 1)}
+
+
+def _ids(ranked: list[dict]) -> list[int]:
+    return [badge["id"] for badge in ranked]
+
+
+def test_rank_badges_prefers_label_matches():
+    badges = _badges(("Home", "header"), ("Sign in", "header"), ("New repository", "main-content"))
+
+    ranked = AgenticExecutor._rank_badges("Click the New repository button", badges)
+
+    assert _ids(ranked) == [3, 1, 2]
+
+
+def test_rank_badges_counts_region_hints():
+    badges = _badges(("Settings", "main-content"), ("Profile", "top-right"), ("Settings", "top-right"))
+
+    ranked = AgenticExecutor._rank_badges("Open settings in the top right corner", badges)
+
+    assert _ids(ranked) == [3, 2, 1]
+
+
+def test_rank_badges_ignores_short_words():
+    badges = _badges(("Go to page", "main-content"), ("Search", "header"))
+
+    ranked = AgenticExecutor._rank_badges("Go to search", badges)
+
+    assert _ids(ranked) == [2, 1]
+
+
+def test_rank_badges_keeps_page_order_on_ties():
+    badges = _badges(*[(f"Item {i}", "main-content") for i in range(5)])
+
+    assert _ids(AgenticExecutor._rank_badges("Do something", badges)) == [1, 2, 3, 4, 5]
+
+
+def test_rank_badges_trims_to_limit():
+    badges = _badges(*[(f"Link {i}", "main-content") for i in range(PROMPT_BADGE_LIMIT + 10)])
+    badges[len(badges)]["label"] = "Checkout"
+
+    ranked = AgenticExecutor._rank_badges("Proceed to checkout", badges)
+
+    assert len(ranked) == PROMPT_BADGE_LIMIT
+    assert ranked[0]["id"] == len(badges)
+
+
+def test_rank_badges_tolerates_missing_region():
+    badges = {1: {"id": 1, "label": "Menu"}}
+
+    assert _ids(AgenticExecutor._rank_badges("Open the sidebar menu", badges)) == [1]
+
+
+def _metrics(width: int, height: int, pixel_ratio: float = 1, page_x: float = 0, page_y: float = 0) -> dict:
+    return {
+        "cssVisualViewport": {"clientWidth": width, "clientHeight": height, "pageX": page_x, "pageY": page_y},
+        "visualViewport": {"clientWidth": width * pixel_ratio, "clientHeight": height * pixel_ratio},
+    }
+
+
+def test_screenshot_clip_covers_scrolled_viewport():
+    clip = screenshot_clip(_metrics(1280, 720, page_x=10, page_y=500))
+
+    assert clip == {"x": 10, "y": 500, "width": 1280, "height": 720, "scale": 1}
+
+
+def test_screenshot_clip_scales_to_max_side():
+    clip = screenshot_clip(_metrics(1920, 1080))
+
+    assert clip["width"] == 1920
+    assert clip["width"] * clip["scale"] == pytest.approx(SCREENSHOT_MAX_SIDE)
+
+
+def test_screenshot_clip_accounts_for_pixel_ratio():
+    clip = screenshot_clip(_metrics(1000, 500, pixel_ratio=2))
+
+    assert clip["width"] * 2 * clip["scale"] == pytest.approx(SCREENSHOT_MAX_SIDE)
+
+
+def test_screenshot_clip_never_upscales():
+    assert screenshot_clip(_metrics(640, 480))["scale"] == 1
+    assert screenshot_clip({"cssVisualViewport": {"clientWidth": 0, "clientHeight": 0, "pageX": 0, "pageY": 0}})["scale"] == 1
@@ -0,0 +1,22 @@
+"""
+Tests for the frozen runtime settings.
+"""
+import dataclasses
+
+import pytest
+
+from config import RuntimeSettings, Settings, get_settings
+
+
+def test_runtime_settings_mirror_settings():
+    fields = {field.name for field in dataclasses.fields(RuntimeSettings)}
+
+    assert fields == set(Settings.model_fields) | {"temp_path"}
+
+
+def test_runtime_settings_are_frozen():
+    settings = get_settings()
+
+    assert settings.temp_path.is_dir()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.port = 1
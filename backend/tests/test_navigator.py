@@ -0,0 +1,62 @@
+"""
+Tests for the Set-of-Mark screenshot helpers in the navigator.
+"""
+import cv2
+import numpy as np
+import pytest
+
+from cortex.navigator import SOM_CROP_PADDING, SOM_IMAGE_MAX_SIDE, VIEWPORT, badge_clip, encode_for_vision
+
+
+def _badge(x: float, y: float, width: float = 40, height: float = 20) -> dict:
+    return {"rect": {"x": x, "y": y, "width": width, "height": height}}
+
+
+def _png(width: int, height: int) -> bytes:
+    ok, encoded = cv2.imencode(".png", np.zeros((height, width, 3), np.uint8))
+    assert ok
+    return encoded.tobytes()
+
+
+def test_badge_clip_pads_bounding_box():
+    clip = badge_clip([_badge(500, 400), _badge(700, 300, 100, 50)], VIEWPORT)
+
+    assert clip == {
+        "x": 500 - SOM_CROP_PADDING,
+        "y": 300 - SOM_CROP_PADDING,
+        "width": 800 - 500 + 2 * SOM_CROP_PADDING,
+        "height": 420 - 300 + 2 * SOM_CROP_PADDING,
+    }
+
+
+def test_badge_clip_clamps_to_viewport():
+    clip = badge_clip([_badge(10, 5), _badge(1900, 1070)], VIEWPORT)
+
+    assert clip == {"x": 0, "y": 0, "width": VIEWPORT["width"], "height": VIEWPORT["height"]}
+
+
+def test_badge_clip_outside_viewport():
+    assert badge_clip([_badge(3000, 2000)], VIEWPORT) is None
+
+
+def test_encode_for_vision_crops_in_css_pixels():
+    # 2x device scale factor: the screenshot is twice the viewport size
+    png = _png(VIEWPORT["width"] * 2, VIEWPORT["height"] * 2)
+
+    jpeg = encode_for_vision(png, {"x": 100, "y": 50, "width": 300, "height": 200})
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+    assert image.shape[:2] == (400, 600)
+
+
+def test_encode_for_vision_shrinks_to_max_side():
+    jpeg = encode_for_vision(_png(VIEWPORT["width"], VIEWPORT["height"]))
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+    assert max(image.shape[:2]) == SOM_IMAGE_MAX_SIDE
+    assert image.shape[1] / image.shape[0] == pytest.approx(VIEWPORT["width"] / VIEWPORT["height"], rel=0.01)
+
+
+def test_encode_for_vision_rejects_garbage():
+    with pytest.raises(ValueError):
+        encode_for_vision(b"not an image")
@@ -0,0 +1,136 @@
+"""
+Tests for the pure plan-parsing helpers in the vision parser.
+"""
+import json
+
+import pydantic
+import pytest
+
+from cortex.schemas import ActionStep, ExecutionPlan, PlanBatch
+from cortex.vision_parser import _parse_plan, _post_process_steps, _StepScanner, _timestamp_seconds
+
+
+STEPS = [
+    {"id": 1, "action_type": "CLICK", "description": "Open {menu}", "timestamp": "00:01"},
+    {"id": 2, "action_type": "TYPE", "description": 'Type "}" \\ done', "value": "a}b", "timestamp": "00:02"},
+]
+PLAN_JSON = json.dumps({"steps": STEPS}, indent=2)
+
+
+def _feed_in_chunks(text: str, size: int) -> list[dict]:
+    scanner = _StepScanner()
+    steps = []
+    for i in range(0, len(text), size):
+        steps.extend(scanner.feed(text[i:i + size]))
+    return steps
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(PLAN_JSON)])
+def test_step_scanner_yields_each_step_once(size):
+    assert _feed_in_chunks(PLAN_JSON, size) == STEPS
+
+
+def test_step_scanner_waits_for_closing_brace():
+    scanner = _StepScanner()
+    text = json.dumps({"steps": STEPS[:1]})
+    cut = text.rindex("}", 0, -1)
+
+    assert scanner.feed(text[:cut]) == []
+    assert scanner.feed(text[cut:]) == STEPS[:1]
+
+
+def test_step_scanner_ignores_text_before_steps_array():
+    assert _StepScanner().feed('```json\n{"note": "[x]", "steps": []}') == []
+
+
+def test_step_scanner_skips_malformed_objects():
+    text = '{"steps": [{"id": 1,, }, {"id": 2}]}'
+
+    assert _StepScanner().feed(text) == [{"id": 2}]
+
+
+@pytest.mark.parametrize("timestamp, seconds", [
+    ("00:00", 0),
+    ("01:05", 65),
+    ("59:59", 3599),
+    ("1:05", 65),
+    ("100:00", 6000),
+    ("12", 12),
+    ("12.7", 12),
+])
+def test_timestamp_seconds(timestamp, seconds):
+    assert _timestamp_seconds(timestamp) == seconds
+
+
+@pytest.mark.parametrize("timestamp", ["ab:cd", "0x:10", ""])
+def test_timestamp_seconds_rejects_garbage(timestamp):
+    with pytest.raises(ValueError):
+        _timestamp_seconds(timestamp)
+
+
+def _step(id: int, action_type: str, value: str | None = None) -> ActionStep:
+    return ActionStep(id=id, action_type=action_type, description=f"step {id}", value=value)
+
+
+def test_post_process_merges_growing_type_actions():
+    steps = [
+        _step(1, "CLICK"),
+        _step(2, "TYPE", "git"),
+        _step(3, "TYPE", "github"),
+        _step(4, "TYPE", "github.com"),
+        _step(5, "CLICK"),
+    ]
+
+    merged = _post_process_steps(steps)
+
+    assert [(s.id, s.action_type, s.value) for s in merged] == [
+        (1, "CLICK", None),
+        (2, "TYPE", "github.com"),
+        (3, "CLICK", None),
+    ]
+
+
+def test_post_process_merges_shrinking_type_actions():
+    merged = _post_process_steps([_step(1, "TYPE", "hello"), _step(2, "TYPE", "hel")])
+
+    assert [s.value for s in merged] == ["hel"]
+
+
+def test_post_process_keeps_unrelated_type_actions():
+    steps = [_step(1, "TYPE", "user"), _step(2, "TYPE", "password"), _step(3, "TYPE", None)]
+
+    merged = _post_process_steps(steps)
+
+    assert [s.value for s in merged] == ["user", "password", None]
+    assert [s.id for s in merged] == [1, 2, 3]
+
+
+def test_post_process_empty():
+    assert _post_process_steps([]) == []
+
+
+@pytest.mark.parametrize("text", [
+    PLAN_JSON,
+    f"  {PLAN_JSON}\n",
+    f"```json\n{PLAN_JSON}\n```",
+    f"\n```json\n{PLAN_JSON}\n```\n",
+    f"```\n{PLAN_JSON}",
+])
+def test_parse_plan_strips_fences(text):
+    plan = _parse_plan(text, ExecutionPlan)
+
+    assert [s.id for s in plan.steps] == [1, 2]
+    assert plan.steps[1].value == "a}b"
+
+
+def test_parse_plan_batch():
+    text = "```json\n" + json.dumps({"plans": [{"steps": STEPS}, {"steps": []}]}) + "\n```"
+
+    batch = _parse_plan(text, PlanBatch)
+
+    assert [len(plan.steps) for plan in batch.plans] == [2, 0]
+
+
+def test_parse_plan_rejects_invalid_json():
+    with pytest.raises(pydantic.ValidationError):
+        _parse_plan("Sorry, I can't help with that.", ExecutionPlan)
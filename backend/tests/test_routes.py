@@ -0,0 +1,29 @@
+"""
+Tests for upload validation in the API routes.
+"""
+import pytest
+
+from api.routes import _looks_like_video
+
+
+@pytest.mark.parametrize("head", [
+    b"\x00\x00\x00\x20ftypisom\x00\x00\x02\x00",  # MP4
+    b"\x00\x00\x00\x14ftypqt  \x00\x00\x00\x00",  # QuickTime
+    b"\x00\x00\x00\x08wide\x00\x00\x00\x00mdat",  # MOV without a leading ftyp
+    b"\x00\x00\x00\x08moov",
+    b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01",      # WebM / Matroska
+])
+def test_accepts_video_signatures(head):
+    assert _looks_like_video(head)
+
+
+@pytest.mark.parametrize("head", [
+    b"",
+    b"\x1a\x45\xdf",
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR",
+    b"%PDF-1.7\n%\xe2\xe3\xcf\xd3",
+    b"<!DOCTYPE html><html>",
+    b"ftypisom\x00\x00\x02\x00",  # Box type at the wrong offset
+])
+def test_rejects_other_content(head):
+    assert not _looks_like_video(head)
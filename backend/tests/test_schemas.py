@@ -0,0 +1,82 @@
+"""
+Tests for the plan schemas (frame serialization, derived URL hints).
+"""
+import pydantic
+import pytest
+
+from cortex.schemas import ActionStep, BadgeBatchChoice, ExecutionPlan
+
+
+JPEG_BYTES = b"\xff\xd8\xff\xe0 not really a jpeg \x00\xff\xd9"
+
+
+def _step(**fields) -> ActionStep:
+    return ActionStep(**{"id": 1, "action_type": "CLICK", "description": "Click it", **fields})
+
+
+def test_visual_context_round_trips_through_json():
+    plan = ExecutionPlan(steps=[_step(visual_context=JPEG_BYTES)])
+
+    restored = ExecutionPlan.model_validate_json(plan.model_dump_json())
+
+    assert restored.steps[0].visual_context == JPEG_BYTES
+
+
+def test_visual_context_is_base64_in_json_mode_only():
+    step = _step(visual_context=b"\x00\xff")
+
+    assert step.model_dump()["visual_context"] == b"\x00\xff"
+    assert step.model_dump(mode="json")["visual_context"] == "AP8="
+
+
+def test_visual_context_accepts_base64_string():
+    assert _step(visual_context="AP8=").visual_context == b"\x00\xff"
+
+
+def test_visual_context_defaults_to_none():
+    step = _step()
+
+    assert step.visual_context is None
+    assert step.model_dump(mode="json")["visual_context"] is None
+
+
+def test_steps_are_frozen():
+    step = _step(value="github.com")
+
+    with pytest.raises(pydantic.ValidationError):
+        step.value = "gitlab.com"
+
+
+@pytest.mark.parametrize("value, url, domain", [
+    ("https://github.com/new", "https://github.com/new", "github.com"),
+    ("github.com", "https://github.com", "github.com"),
+    ("example.org", "https://example.org", "example.org"),
+    ("New repository", "https://New repository", None),
+    (None, None, None),
+    ("", None, None),
+])
+def test_url_hints(value, url, domain):
+    step = _step(value=value)
+
+    assert step.normalized_url == url
+    assert step.expected_domain == domain
+
+
+def test_url_hints_follow_model_copy():
+    step = _step(value="github.com")
+
+    copy = step.model_copy(update={"value": "https://gitlab.org/x"})
+
+    assert copy.normalized_url == "https://gitlab.org/x"
+    assert copy.expected_domain == "gitlab.org"
+    assert step.expected_domain == "github.com"
+
+
+def test_badge_batch_choice_rejects_incomplete_answers():
+    choices = BadgeBatchChoice.model_validate_json('{"choices": [{"step": 1, "badge": 7}]}').choices
+
+    assert [(c.step, c.badge) for c in choices] == [(1, 7)]
+    with pytest.raises(pydantic.ValidationError):
+        BadgeBatchChoice.model_validate_json('{"choices": [{"step": 1}]}')
+    with pytest.raises(pydantic.ValidationError):
+        BadgeBatchChoice.model_validate_json("[1, 7]")
@@ -0,0 +1,142 @@
+"""
+Tests for the SSE execution stream (overflow policy, drain on close).
+"""
+import asyncio
+import json
+
+from api.sse import MAX_BUFFERED_EVENTS, ExecutionStream, build_frame
+
+
+def _events(chunks: list[bytes]) -> list[tuple[str, dict]]:
+    """Split streamed chunks back into (event type, payload) pairs."""
+    events = []
+    for frame in b"".join(chunks).split(b"\n\n"):
+        if not frame:
+            continue
+        header, data = frame.split(b"\n", 1)
+        events.append((header.removeprefix(b"event: ").decode(), json.loads(data.removeprefix(b"data: "))))
+    return events
+
+
+def _collect(stream: ExecutionStream) -> list[bytes]:
+    async def run() -> list[bytes]:
+        return [chunk async for chunk in stream]
+    return asyncio.run(run())
+
+
+def test_build_frame():
+    assert build_frame(b'{"a":1}') == b'event: message\ndata: {"a":1}\n\n'
+
+
+def test_events_are_delivered_in_order():
+    stream = ExecutionStream()
+    stream.send_log("first")
+    stream.send_action(1, "running")
+    stream.send_action_with_log(1, "error", "Timed out", "error")
+    stream.close()
+
+    events = _events(_collect(stream))
+
+    assert [data["type"] for _, data in events] == ["log", "action", "action"]
+    assert events[0][1] == {"type": "log", "level": "info", "message": "first"}
+    assert events[2][1]["message"] == "Timed out"
+    assert events[2][1]["level"] == "error"
+
+
+def test_consecutive_logs_fold_on_overflow():
+    stream = ExecutionStream()
+    for i in range(MAX_BUFFERED_EVENTS):
+        stream.send_log(f"line {i}")
+    stream.send_log("extra 1")
+    stream.send_log("extra 2")
+
+    assert len(stream._buf) == MAX_BUFFERED_EVENTS
+    assert stream.dropped == 2
+
+    stream.send_action(1, "complete")
+    stream.close()
+    events = _events(_collect(stream))
+
+    messages = [data.get("message") for _, data in events]
+    assert "... (2 more lines)" in messages
+    assert events[-2][1]["step_id"] == 1
+    assert events[-1] == ("dropped", {"dropped": stream.dropped})
+
+
+def test_buffer_never_exceeds_bound():
+    stream = ExecutionStream()
+    for i in range(MAX_BUFFERED_EVENTS - 1):
+        stream.send_action(i, "running")
+    # Fold some logs, then push a non-log frame that must flush the marker too
+    for i in range(5):
+        stream.send_log(f"line {i}")
+    stream.send_action(999, "complete")
+
+    assert len(stream._buf) <= MAX_BUFFERED_EVENTS
+
+    stream.close()
+    chunks = _collect(stream)
+    assert len(_events(chunks)) <= MAX_BUFFERED_EVENTS
+
+
+def test_non_log_overflow_evicts_oldest():
+    stream = ExecutionStream()
+    for i in range(MAX_BUFFERED_EVENTS + 3):
+        stream.send_action(i, "running")
+    stream.close()
+
+    events = _events(_collect(stream))
+
+    # One more frame makes way for the "dropped" notice itself
+    assert len(events) == MAX_BUFFERED_EVENTS
+    step_ids = [data["step_id"] for kind, data in events if kind == "message"]
+    assert step_ids[0] == 4
+    assert step_ids[-1] == MAX_BUFFERED_EVENTS + 2
+    assert events[-1] == ("dropped", {"dropped": 4})
+
+
+def test_close_during_flush_checkpoint_keeps_final_frames():
+    stream = ExecutionStream()
+
+    async def run() -> list[bytes]:
+        chunks = []
+        stream.send_log("before")
+        async for chunk in stream:
+            chunks.append(chunk)
+            if len(chunks) == 1:
+                # Lands while the iterator sits in its post-yield checkpoint
+                stream.send_log("last")
+                stream.close()
+        return chunks
+
+    events = _events(asyncio.run(run()))
+
+    assert [data["message"] for _, data in events] == ["before", "last"]
+
+
+def test_drain_and_close_waits_for_consumer():
+    stream = ExecutionStream()
+
+    async def run() -> list[bytes]:
+        consumer = asyncio.create_task(_consume(stream))
+        stream.send_log("done")
+        await stream.drain_and_close(timeout=1)
+        assert consumer.done()
+        return consumer.result()
+
+    events = _events(asyncio.run(run()))
+
+    assert [data["message"] for _, data in events] == ["done"]
+
+
+def test_drain_and_close_times_out_without_consumer():
+    stream = ExecutionStream()
+    stream.send_log("nobody listening")
+
+    asyncio.run(stream.drain_and_close(timeout=0.01))
+
+    assert not stream.is_active
+
+
+async def _consume(stream: ExecutionStream) -> list[bytes]:
+    return [chunk async for chunk in stream]
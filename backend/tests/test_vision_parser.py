@@ -50,7 +50,7 @@ async def main():
         # Save JSON output
         output_file = output_dir / "execution_plan.json"
         with open(output_file, "w") as f:
-            json.dump(plan.model_dump(), f, indent=2)
+            json.dump(plan.model_dump(mode="json"), f, indent=2)
         
         print(f"\n✅ SUCCESS! Extracted {len(plan.steps)} steps")
         print(f"📄 Output saved to: {output_file}")
@@ -35,6 +35,9 @@ export interface SSEActionEvent {
     step_id: number;
     status: "running" | "complete" | "error";
     screenshot?: string;
+    // Log line sent in the same frame as the status change
+    message?: string;
+    level?: string;
 }
 
 export type SSEEvent = SSELogEvent | SSEActionEvent;
@@ -141,6 +144,9 @@ export function subscribeToExecution(
                 }
             } else if (data.type === "action") {
                 callbacks.onActionUpdate(data.step_id, data.status, data.screenshot);
+                if (data.message) {
+                    callbacks.onLog(data.message, data.level ?? "info");
+                }
             }
         } catch (e) {
             console.error("Failed to parse SSE event:", e);